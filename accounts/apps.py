@@ -1,5 +1,23 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_save
 
 
 class AccountsConfig(AppConfig):
     name = 'accounts'
+
+    def ready(self):
+        from django.contrib.auth.models import Group, Permission
+        from . import permissions
+        from .models import User
+
+        # Qualquer mudança em grupos/permissões invalida o cache de permissões
+        for through in (User.groups.through, User.user_permissions.through,
+                        Group.permissions.through):
+            m2m_changed.connect(permissions.invalidate, sender=through,
+                                dispatch_uid='perms_cache_%s' % through.__name__)
+        post_delete.connect(permissions.invalidate, sender=Group,
+                            dispatch_uid='perms_cache_group_delete')
+        post_save.connect(permissions.invalidate, sender=Permission,
+                          dispatch_uid='perms_cache_permission_save')
+        post_delete.connect(permissions.invalidate, sender=Permission,
+                            dispatch_uid='perms_cache_permission_delete')
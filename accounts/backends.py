@@ -1,18 +1,60 @@
 # coding=utf-8
 
 from django.contrib.auth.backends import ModelBackend as BaseModelBackend
+from django.db.models import Case, IntegerField, Q, Value, When
 
 from .models import User
+from . import permissions
+
 
 class ModelBackend(BaseModelBackend):
+    """
+    Autentica por nome de usuário ou e-mail numa única consulta
+    (UPPER(username)/UPPER(email) são indexados) e guarda o conjunto de
+    permissões do usuário no cache compartilhado entre requisições.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        # A correspondência exata vem primeiro, para caber nas duas linhas
+        # lidas mesmo com vários usuários que só diferem em maiúsculas
+        exato = Case(
+            When(Q(username=username) | Q(email=username), then=Value(0)),
+            default=Value(1), output_field=IntegerField(),
+        )
+        candidatos = list(
+            User.objects.filter(Q(username__iexact=username) | Q(email__iexact=username))
+            .order_by(exato, 'pk')[:2]
+        )
+        user = self._escolher_usuario(candidatos, username)
+        if user is None:
+            # Roda o hasher uma vez para não revelar se o usuário existe
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
 
-    def authenticate(self, username=None, password=None):
-        if not username is None:
-            try:
-                user = User.objects.get(email=username)
-                if user.check_password(password):
-                    return user
-            except User.DoesNotExist:
-                pass
+    def _escolher_usuario(self, candidatos, username):
+        if len(candidatos) == 1:
+            return candidatos[0]
+        # Mais de um candidato: só aceita a correspondência exata
+        for user in candidatos:
+            if user.username == username or user.email == username:
+                return user
+        return None
 
-# serve para LOGAR com email
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            perms = permissions.get_cached(user_obj)
+            if perms is None:
+                perms = super(ModelBackend, self).get_all_permissions(user_obj)
+                permissions.set_cached(user_obj, perms)
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
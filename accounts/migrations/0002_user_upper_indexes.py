@@ -0,0 +1,36 @@
+# Índices em UPPER(username) e UPPER(email) para o login sem diferenciar
+# maiúsculas (username__iexact/email__iexact). Só no PostgreSQL.
+
+from django.db import migrations
+
+INDEXES = (
+    ('accounts_user_username_upper_idx', 'username'),
+    ('accounts_user_email_upper_idx', 'email'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in INDEXES:
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS {} ON accounts_user (UPPER("{}"::text))'.format(name, column)
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS {}'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,49 @@
+# coding=utf-8
+"""
+Cache do conjunto de permissões dos usuários, compartilhado entre
+requisições (e entre workers, com um cache que não seja por processo).
+
+As chaves levam uma geração que é trocada sempre que grupos ou permissões
+mudam, o que invalida todos os conjuntos de uma vez.
+"""
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+
+GENERATION_KEY = 'perms:generation'
+
+
+def _cache():
+    return caches[getattr(settings, 'PERMISSION_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'PERMISSION_CACHE_TIMEOUT', 3600)
+
+
+def generation():
+    cache = _cache()
+    gen = cache.get(GENERATION_KEY)
+    if gen is None:
+        gen = uuid4().hex
+        if not cache.add(GENERATION_KEY, gen, None):
+            gen = cache.get(GENERATION_KEY, gen)
+    return gen
+
+
+def cache_key(user):
+    return 'perms:{}:{}:{}'.format(generation(), user.pk, int(user.is_superuser))
+
+
+def get_cached(user):
+    return _cache().get(cache_key(user))
+
+
+def set_cached(user, perms):
+    _cache().set(cache_key(user), set(perms), _timeout())
+
+
+def invalidate(**kwargs):
+    _cache().set(GENERATION_KEY, uuid4().hex, None)
+
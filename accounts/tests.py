@@ -1,3 +1,25 @@
 from django.test import TestCase
 
-# Create your tests here.
+from .backends import ModelBackend
+from .models import User
+
+
+class ModelBackendTests(TestCase):
+
+    def test_usuario_exato_entre_variantes_de_maiusculas(self):
+        for indice, username in enumerate(('ANA', 'Ana', 'ana')):
+            user = User(username=username, email='ana{}@example.com'.format(indice))
+            user.set_password('senha')
+            user.save()
+        backend = ModelBackend()
+        for username in ('ANA', 'Ana', 'ana'):
+            user = backend.authenticate(None, username=username, password='senha')
+            self.assertEqual(user.username, username)
+        self.assertIsNone(backend.authenticate(None, username='aNa', password='senha'))
+
+    def test_login_por_email_sem_diferenciar_maiusculas(self):
+        user = User(username='bia', email='bia@example.com')
+        user.set_password('senha')
+        user.save()
+        self.assertEqual(
+            ModelBackend().authenticate(None, username='BIA@example.com', password='senha'), user)
@@ -87,21 +87,15 @@ $(function(){
     function stopTimer() {
         clearInterval(timer);
         hr_actual = h + ':' + min + ':' + s;
-        min_conometrado = 1;
-        seg_conometrado = i;
-        while(seg_conometrado > 59) {
-            min_conometrado++;
-            seg_conometrado -= 60;
-        }
-        seg_conometrado = seg_conometrado.toString().length > 1 ? seg_conometrado : ("0" + seg_conometrado);
-        min_conometrado = min_conometrado.toString().length > 1 ? min_conometrado : ("0" + min_conometrado);
-        data_conometrada = "00:" + min_conometrado + ":" + seg_conometrado;
-        novaHora = somaHora(hr_actual, data_conometrada, false);
+        // i segundos cronometrados -> HH:MM:SS (o servidor grava como duração)
+        let pad = (n) => n.toString().length > 1 ? n.toString() : ('0' + n);
+        data_conometrada = pad(Math.floor(i / 3600)) + ':' + pad(Math.floor(i / 60) % 60) + ':' + pad(i % 60);
+        novaHora = somaHora(hr_actual, data_conometrada, true);
         // console.log(data_conometrada);
         // console.log(novaHora);
         $('#show_time_result').html(novaHora);
         $('#id_time_end').val(novaHora);
-        $('#id_time_total').val(data_conometrada);
+        $('#id_duration').val(data_conometrada);
     }
     function somaHora(hrA, hrB, zerarHora) {
         if(hrA.length != 8 || hrB.length != 8) return "00:00:00";
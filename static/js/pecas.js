@@ -27,12 +27,21 @@ $("#add-item").click(function(ev) {
   $('#id_itenspecas_set-' + (count) + '-subtotal').addClass('clSubtotal');
 });
 
-$(document).on('focusout', '.clQuantity', function() {
-  let quantity = $(this).val();
-  let chance_to_price = $(this).attr('id').replace('quantity', 'price');
-  mask = $('#'+chance_to_price).mask('000.000.000.000.000,00', {reverse: true});
-  let price = $('#'+chance_to_price).val();
-  let chance_to_subtotal = $(this).attr('id').replace('quantity', 'subtotal');
-  let calculate = price.replace(',','.') * quantity;
-  $('#'+chance_to_subtotal).val(calculate);
+// Prévia do subtotal; o valor gravado é calculado no servidor
+function toNumber(valor) {
+  return parseFloat((valor || '').replace(/\./g, '').replace(',', '.')) || 0;
+}
+
+function toMoney(valor) {
+  return valor.toLocaleString('pt-BR', {minimumFractionDigits: 2, maximumFractionDigits: 2});
+}
+
+// Por id, para valer também nos itens já gravados (que não recebem as classes)
+let itemFields = '[id^="id_itenspecas_set-"][id$="-quantity"], [id^="id_itenspecas_set-"][id$="-price"]';
+
+$(document).on('input focusout', itemFields, function() {
+  let prefix = $(this).attr('id').replace(/-(quantity|price)$/, '');
+  let price = toNumber($('#' + prefix + '-price').val());
+  let quantity = parseInt($('#' + prefix + '-quantity').val(), 10) || 0;
+  $('#' + prefix + '-subtotal').val(toMoney(price * quantity));
 });
@@ -0,0 +1,275 @@
+# coding=utf-8
+"""
+Métricas por view no formato texto do Prometheus.
+
+``MetricsMiddleware`` mede cada requisição (latência, consultas SQL e tempo
+no banco via ``connection.execute_wrapper``, tamanho da resposta) e soma em
+memória, no próprio processo. Respostas em streaming (exportações CSV/NDJSON)
+são medidas até o fim do envio, não até a view devolver o gerador. Uma
+thread de cada worker grava os seus totais num arquivo próprio em
+METRICS_DIR a cada METRICS_FLUSH_INTERVAL segundos; a view ``metrics_view``
+soma os arquivos de todos os workers. Assim a requisição não escreve em
+disco, o custo por requisição fica em alguns microssegundos e nenhum worker
+precisa falar com os outros.
+
+Cada worker grava num arquivo com o seu pid. A cada leitura, os arquivos
+de workers que já terminaram (reinício, max-requests) são somados em
+``retired.json`` e apagados, então o diretório não cresce e os contadores
+continuam só subindo.
+"""
+import atexit
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Limites (em segundos) dos buckets do histograma de latência
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Posições em cada linha de totais: depois delas vêm os buckets (+Inf no fim)
+COUNT, SECONDS, QUERIES, QUERY_SECONDS, BYTES = range(5)
+FIELDS = 5
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', os.path.join('/tmp', 'urban_train_metrics'))
+
+
+class Registry:
+    """Totais deste processo, por view."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.started = int(time.time())
+        self.dirty = False
+        self.thread_pid = None
+
+    @property
+    def path(self):
+        return os.path.join(metrics_dir(), 'worker-{}-{}.json'.format(os.getpid(), self.started))
+
+    def observe(self, view, seconds, queries, query_seconds, size):
+        with self.lock:
+            row = self.views.get(view)
+            if row is None:
+                row = self.views[view] = [0] * (FIELDS + len(BUCKETS) + 1)
+            row[COUNT] += 1
+            row[SECONDS] += seconds
+            row[QUERIES] += queries
+            row[QUERY_SECONDS] += query_seconds
+            row[BYTES] += size
+            row[FIELDS + bisect_left(BUCKETS, seconds)] += 1
+            self.dirty = True
+        if self.thread_pid != os.getpid():
+            self.start()
+
+    def start(self):
+        """Inicia a thread que grava os totais (uma por processo, também depois de um fork)."""
+        with self.lock:
+            if self.thread_pid == os.getpid():
+                return
+            self.thread_pid = os.getpid()
+        threading.Thread(target=self._run, name='metrics-flush', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 5))
+            if self.dirty:
+                self.flush()
+
+    def flush(self):
+        """Grava os totais do processo (troca atômica do arquivo)."""
+        with self.lock:
+            data = json.dumps(self.views)
+            self.dirty = False
+        os.makedirs(metrics_dir(), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+
+registry = Registry()
+atexit.register(lambda: registry.views and registry.flush())
+
+
+RETIRED = 'retired.json'
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _add(total, views):
+    for view, row in views.items():
+        acc = total.setdefault(view, [0] * len(row))
+        for i, value in enumerate(row):
+            acc[i] += value
+    return total
+
+
+def _alive(path):
+    try:
+        pid = int(os.path.basename(path).split('-')[1])
+    except (IndexError, ValueError):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def prune():
+    """
+    Soma os arquivos dos workers que já terminaram em retired.json e os
+    apaga, sob um lock do diretório. Sem fcntl (Windows) não faz nada.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return
+    directory = metrics_dir()
+    if not os.path.isdir(directory):
+        return
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = [path for path in glob.glob(os.path.join(directory, 'worker-*.json'))
+                if not _alive(path)]
+        if not dead:
+            return
+        retired = _read(os.path.join(directory, RETIRED))
+        for path in dead:
+            _add(retired, _read(path))
+        tmp = os.path.join(directory, RETIRED + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(retired, f)
+        os.replace(tmp, os.path.join(directory, RETIRED))
+        for path in dead:
+            os.remove(path)
+
+
+def collect():
+    """Soma os totais gravados pelos workers, vivos e encerrados."""
+    prune()
+    paths = glob.glob(os.path.join(metrics_dir(), 'worker-*.json'))
+    paths.append(os.path.join(metrics_dir(), RETIRED))
+    total = {}
+    for path in paths:
+        _add(total, _read(path))
+    return total
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(views):
+    """Texto no formato de exposição do Prometheus (0.0.4)."""
+    def label(view):
+        return '{view="%s"}' % escape(view)
+
+    linhas = [
+        '# HELP urban_train_request_duration_seconds Latência das requisições por view.',
+        '# TYPE urban_train_request_duration_seconds histogram',
+    ]
+    for view in sorted(views):
+        row = views[view]
+        acumulado = 0
+        for i, limite in enumerate(BUCKETS + ('+Inf',)):
+            acumulado += row[FIELDS + i]
+            linhas.append('urban_train_request_duration_seconds_bucket{view="%s",le="%s"} %d' % (
+                escape(view), limite, acumulado))
+        linhas.append('urban_train_request_duration_seconds_sum%s %.6f' % (label(view), row[SECONDS]))
+        linhas.append('urban_train_request_duration_seconds_count%s %d' % (label(view), row[COUNT]))
+    for nome, indice, ajuda, formato in (
+        ('urban_train_db_queries_total', QUERIES, 'Consultas SQL por view.', '%d'),
+        ('urban_train_db_query_seconds_total', QUERY_SECONDS, 'Tempo no banco por view.', '%.6f'),
+        ('urban_train_response_bytes_total', BYTES, 'Bytes de resposta por view.', '%d'),
+    ):
+        linhas.append('# HELP {} {}'.format(nome, ajuda))
+        linhas.append('# TYPE {} counter'.format(nome))
+        for view in sorted(views):
+            linhas.append(('%s%s ' + formato) % (nome, label(view), views[view][indice]))
+    return '\n'.join(linhas) + '\n'
+
+
+class MetricsMiddleware:
+    """Deve ser o primeiro de MIDDLEWARE para medir a requisição inteira."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sql = [0, 0.0]
+
+        def wrapper(execute, query, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(query, params, many, context)
+            finally:
+                sql[0] += 1
+                sql[1] += time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with connections['default'].execute_wrapper(wrapper):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else 'unmatched'
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, view, inicio, sql, wrapper)
+        else:
+            registry.observe(view, time.perf_counter() - inicio, sql[0], sql[1],
+                             len(response.content))
+        return response
+
+    def stream(self, content, view, inicio, sql, wrapper):
+        """
+        Repassa o conteúdo em streaming contando bytes e consultas, e
+        registra a requisição quando o envio termina (ou o cliente fecha a
+        conexão: o Django chama close() do gerador).
+        """
+        size = 0
+        try:
+            with connections['default'].execute_wrapper(wrapper):
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            registry.observe(view, time.perf_counter() - inicio, sql[0], sql[1], size)
+
+
+def authorized(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return hmac.compare_digest(header.encode(), ('Bearer ' + token).encode())
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_active and user.is_staff)
+
+
+def metrics_view(request):
+    """
+    Endpoint /metrics. Com METRICS_TOKEN, exige o cabeçalho
+    ``Authorization: Bearer <token>``; sem ele, só a equipe (is_staff)
+    logada acessa.
+    """
+    if not authorized(request):
+        return HttpResponseForbidden()
+    registry.flush()
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'urban_train.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -152,8 +153,8 @@ CRISPY_TEMPLATE_PACK = 'bootstrap4'
 # auth
 LOGIN_URL = '/entrar/'
 AUTH_USER_MODEL = 'accounts.User'
+# Um único backend: login por usuário ou e-mail (accounts.backends)
 AUTHENTICATION_BACKENDS = (
-    'django.contrib.auth.backends.ModelBackend',
     'accounts.backends.ModelBackend',
 )
 
@@ -166,13 +167,59 @@ INTERNAL_IPS = [
 # CACHES
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#caches
+SHARED_CACHE_URL = env('SHARED_CACHE_URL', default='')
+SHARED_CACHE_DIR = env('SHARED_CACHE_DIR', default=os.path.join('/tmp', 'urban_train_cache'))
+
+
+def _shared_cache(nome, max_entries):
+    """
+    Cache compartilhado entre os workers do gunicorn, um alias por uso.
+    Com SHARED_CACHE_URL (memcache://, pymemcache://, rediscache://) todos
+    os usos ficam no mesmo servidor, separados pelo KEY_PREFIX. Sem ela,
+    cada uso tem um FileBasedCache num diretório próprio: o _cull desse
+    backend lista o diretório inteiro a cada gravação, então misturar
+    usos encarece todos.
+    """
+    if SHARED_CACHE_URL:
+        config = env.cache_url_config(SHARED_CACHE_URL)
+        config['KEY_PREFIX'] = nome
+        return config
+    return {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(SHARED_CACHE_DIR, nome),
+        "OPTIONS": {
+            "MAX_ENTRIES": max_entries,
+        },
+    }
+
+
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
         "LOCATION": "",
-    }
+    },
+    "permissions": _shared_cache('permissions', 1000),
+    "pages": _shared_cache('pages', 5000),
+    "reports": _shared_cache('reports', 5000),
 }
 
+# Cache do conjunto de permissões dos usuários (accounts.permissions)
+PERMISSION_CACHE_ALIAS = 'permissions'
+PERMISSION_CACHE_TIMEOUT = 60 * 60
+
+# ETag/Last-Modified e cache das páginas de lista dos CRUDs (page_cache)
+CRUDS_CACHE_ALIAS = 'pages'
+CRUDS_PAGE_CACHE_TIMEOUT = env.int('CRUDS_PAGE_CACHE_TIMEOUT', default=10 * 60)
+
+# Cache dos relatórios de gastos (website.report_cache)
+REPORT_CACHE_ALIAS = 'reports'
+REPORT_CACHE_TIMEOUT = env.int('REPORT_CACHE_TIMEOUT', default=24 * 60 * 60)
+
+# Cópia colunar incremental para análises (website.snapshot)
+SNAPSHOT_DIR = env('SNAPSHOT_DIR', default=str(ROOT_DIR('snapshots')))
+# Segundos que cada lote relê antes da exportação anterior (commits atrasados)
+SNAPSHOT_LAG = env.int('SNAPSHOT_LAG', default=60 * 60)
+
 # MEDIA_URL = "/django-summernote/"
 # MEDIA_ROOT = os.path.join(BASE_DIR, "media/")
 
@@ -183,3 +230,17 @@ SUMMERNOTE_CONFIG = {
         'lang': 'pt-BR',
     }
 }
+
+# Autocomplete de nomes de gasto (website.autocomplete)
+# Segundos até recarregar o índice em memória e limite de nomes distintos
+# mantidos em memória antes de passar a consultar o banco.
+AUTOCOMPLETE_TTL = env.int('AUTOCOMPLETE_TTL', default=300)
+AUTOCOMPLETE_MAX_NAMES = env.int('AUTOCOMPLETE_MAX_NAMES', default=200000)
+
+# Métricas por view (urban_train.metrics, exposto em /metrics)
+# Uma thread de cada worker grava seus totais em METRICS_DIR a cada
+# METRICS_FLUSH_INTERVAL segundos; com METRICS_TOKEN o endpoint exige
+# "Authorization: Bearer <token>", sem ele só a equipe (is_staff) logada acessa.
+METRICS_DIR = env('METRICS_DIR', default=os.path.join('/tmp', 'urban_train_metrics'))
+METRICS_FLUSH_INTERVAL = env.int('METRICS_FLUSH_INTERVAL', default=5)
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
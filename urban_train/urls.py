@@ -2,8 +2,11 @@ from django.conf import settings
 from django.urls import path, include
 from django.contrib import admin
 
+from urban_train.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('', include('accounts.urls')),
     path('', include('website.urls')),
 ]
@@ -1,4 +1,6 @@
 from unicodedata import normalize
+from decimal import Decimal, InvalidOperation
+import calendar
 import datetime
 import re
 import string
@@ -9,7 +11,7 @@ VALOR_MONETARIO = re.compile(r'(\d+)[\.\,]{1}(\d{2})')
 
 """
 Função que troca a vírgula por ponto para fazer operações de calcular,
-pois os campos VALOR são todos do tipo CHARFIELD
+pois os campos VALOR eram todos do tipo CHARFIELD
 """
 
 
@@ -17,6 +19,30 @@ def change_comma_by_dot(number):
     return number.replace(",", ".")
 
 
+def parse_decimal_br(valor):
+    """
+    Converte um valor monetário digitado no padrão brasileiro
+    ('R$ 1.234,56', '1234,56') ou com ponto decimal ('1234.56') em Decimal.
+    Levanta ValueError se o valor não for numérico.
+    """
+    if isinstance(valor, Decimal):
+        return valor
+    if isinstance(valor, (int, float)):
+        return Decimal(str(valor))
+    texto = str(valor).replace('R$', '').replace(' ', '').strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    elif texto.count('.') > 1:
+        texto = texto.replace('.', '')
+    try:
+        resultado = Decimal(texto)
+    except InvalidOperation:
+        resultado = None
+    if resultado is None or not resultado.is_finite():
+        raise ValueError('Valor monetário inválido: {!r}'.format(valor))
+    return resultado
+
+
 def random_string(size=250):
     return ''.join(random.SystemRandom().choice(string.ascii_uppercase + string.digits) for _ in range(size))
 
@@ -79,6 +105,21 @@ def format_date_br(data):
 
     return datetime.date(ano, mes, dia)
 
+def month_start(data):
+    return data.replace(day=1)
+
+
+def add_months(data, meses):
+    """
+    Soma meses de calendário a uma data, ajustando o dia para o último
+    dia do mês quando necessário (31/01 + 1 mês = 28/02 ou 29/02).
+    """
+    indice = data.month - 1 + meses
+    ano, mes = data.year + indice // 12, indice % 12 + 1
+    ultimo_dia = calendar.monthrange(ano, mes)[1]
+    return data.replace(year=ano, month=mes, day=min(data.day, ultimo_dia))
+
+
 def convert_date(data):
     try:
         if '/' in data:
@@ -112,3 +153,56 @@ def format_values(item):
         return item[0], new_seq
     else:
         raise TypeError('O tipo {} não é suportado'.format(type(item[1])))
+
+
+PERIODO_DATA = re.compile(
+    r'^(?:(?P<dia>\d{1,2})/)?(?:(?P<mes>\d{1,2})/)?(?P<ano>\d{4})$'
+    r'|^(?P<iso_ano>\d{4})-(?P<iso_mes>\d{1,2})(?:-(?P<iso_dia>\d{1,2}))?$'
+)
+SEPARADOR_PERIODO = re.compile(r'\s+(?:a|até|ate)\s+|\s*\.\.\s*|\s+-\s+', re.IGNORECASE)
+
+
+def _periodo_data(texto):
+    """
+    '15/03/2021' e '2021-03-15' -> o dia; '03/2021' e '2021-03' -> o mês;
+    '2021' -> o ano. Retorna (primeiro dia, último dia) ou None.
+    """
+    m = PERIODO_DATA.match(texto.strip())
+    if not m:
+        return None
+    if m.group('ano'):
+        ano, mes, dia = m.group('ano'), m.group('mes'), m.group('dia')
+        if dia and not mes:
+            # '03/2021': o único número antes do ano é o mês
+            dia, mes = None, dia
+    else:
+        ano, mes, dia = m.group('iso_ano'), m.group('iso_mes'), m.group('iso_dia')
+    try:
+        if dia:
+            data = datetime.date(int(ano), int(mes), int(dia))
+            return data, data
+        if mes:
+            inicio = datetime.date(int(ano), int(mes), 1)
+            return inicio, add_months(inicio, 1) - datetime.timedelta(days=1)
+        return datetime.date(int(ano), 1, 1), datetime.date(int(ano), 12, 31)
+    except ValueError:
+        return None
+
+
+def parse_periodo(texto):
+    """
+    Interpreta uma busca como data ou período: um dia, um mês ou um ano
+    (ver ``_periodo_data``), ou dois deles separados por 'a', 'até', '..'
+    ou ' - ' ('01/2021 a 03/2021'). Retorna (data inicial, data final),
+    inclusivas, ou None se o texto não for uma data.
+    """
+    partes = SEPARADOR_PERIODO.split((texto or '').strip())
+    if len(partes) > 2:
+        return None
+    periodos = [_periodo_data(parte) for parte in partes]
+    if None in periodos:
+        return None
+    inicio, fim = periodos[0][0], periodos[-1][1]
+    if inicio > fim:
+        inicio, fim = periodos[-1][0], periodos[0][1]
+    return inicio, fim
@@ -3,11 +3,13 @@
 from django.contrib import admin
 from .models import Pecas, Itenspecas
 from .forms import PecasForm
+from . import pecas_total
 
 
 class ItensPecasInline(admin.TabularInline):
     model = Itenspecas
     extra = 0
+    readonly_fields = ('subtotal',)
 
 @admin.register(Pecas)
 class PecasAdmin(admin.ModelAdmin):
@@ -17,10 +19,16 @@ class PecasAdmin(admin.ModelAdmin):
             'fields': ('data', 'veiculo', 'proxtroca', 'troca', 'comercio', 'city', 'total',)
         }),
     )
+    readonly_fields = ('total',)
     inlines = (ItensPecasInline,)
     list_filter = ('data', 'veiculo', 'comercio', 'city',)
     list_display = ('data', 'veiculo', 'proxtroca', 'troca', 'comercio', 'city', 'total',)
 
+    def save_related(self, request, form, formsets, change):
+        # Um recálculo do total por nota, não um por item do inline
+        with pecas_total.adiar():
+            super().save_related(request, form, formsets, change)
+
 
 # @admin.register(Itenspecas)
 # class ItensPecasAdmin(admin.ModelAdmin):
@@ -1,5 +1,49 @@
 from django.apps import AppConfig
+from django.db.models.signals import (
+    pre_save, post_save, post_delete, post_migrate
+)
 
 
 class WebsiteConfig(AppConfig):
     name = 'website'
+
+    def ready(self):
+        from vendor.cruds_adminlte.crud import create_view_permissions
+        from . import autocomplete, fts, manutencao, pecas_total, report_cache, summary
+        from .models import Gasto, Itenspecas, Pecas
+
+        post_migrate.connect(create_view_permissions, sender=self,
+                             dispatch_uid='website_crud_view_permissions')
+        post_migrate.connect(fts.recriar_triggers, sender=self,
+                             dispatch_uid='website_fts_triggers')
+
+        # summary.gasto_pre_save lê a linha antiga e os pre_save de
+        # autocomplete e report_cache a reaproveitam: ele precisa ser ligado antes
+        pre_save.connect(summary.gasto_pre_save, sender=Gasto,
+                         dispatch_uid='gasto_summary_pre_save')
+        post_save.connect(summary.gasto_post_save, sender=Gasto,
+                          dispatch_uid='gasto_summary_post_save')
+        post_delete.connect(summary.gasto_post_delete, sender=Gasto,
+                            dispatch_uid='gasto_summary_post_delete')
+        pre_save.connect(autocomplete.gasto_pre_save, sender=Gasto,
+                         dispatch_uid='gasto_autocomplete_pre_save')
+        post_save.connect(autocomplete.gasto_post_save, sender=Gasto,
+                          dispatch_uid='gasto_autocomplete_post_save')
+        post_delete.connect(autocomplete.gasto_post_delete, sender=Gasto,
+                            dispatch_uid='gasto_autocomplete_post_delete')
+        pre_save.connect(report_cache.gasto_pre_save, sender=Gasto,
+                         dispatch_uid='gasto_report_cache_pre_save')
+        post_save.connect(report_cache.gasto_post_save, sender=Gasto,
+                          dispatch_uid='gasto_report_cache_post_save')
+        post_delete.connect(report_cache.gasto_post_delete, sender=Gasto,
+                            dispatch_uid='gasto_report_cache_post_delete')
+        post_save.connect(pecas_total.item_post_save, sender=Itenspecas,
+                          dispatch_uid='itenspecas_total_post_save')
+        post_delete.connect(pecas_total.item_post_delete, sender=Itenspecas,
+                            dispatch_uid='itenspecas_total_post_delete')
+        for model in (Pecas, Itenspecas):
+            uid = 'manutencao_{}'.format(model._meta.model_name)
+            post_save.connect(manutencao.pecas_changed, sender=model,
+                              dispatch_uid=uid + '_post_save')
+            post_delete.connect(manutencao.pecas_changed, sender=model,
+                                dispatch_uid=uid + '_post_delete')
@@ -0,0 +1,164 @@
+# coding=utf-8
+"""
+Sugestões de nome de gasto para o autocomplete do cadastro.
+
+Os nomes distintos ficam em memória num índice ordenado por prefixo de
+palavra (sem acento e em minúsculas), consultado com bisect. O índice é
+carregado uma vez por processo com quantos gastos usam cada nome; os sinais
+de Gasto somam e subtraem dessa contagem (o nome sai do índice quando chega
+a zero) e o índice é recarregado depois de AUTOCOMPLETE_TTL segundos para
+enxergar o que os outros workers gravaram. Se houver mais nomes que AUTOCOMPLETE_MAX_NAMES a
+consulta vai para o banco, que tem índice trigram em UPPER(name).
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db.models import Count
+
+from utils import remover_acentos
+from .models import Gasto
+
+LIMIT = 10
+
+
+def normalize(texto):
+    return remover_acentos(texto or '').lower().strip()
+
+
+class NameIndex:
+
+    def __init__(self, limit=LIMIT):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._keys = None
+        self._names = {}
+        self._loaded_at = 0
+        self._in_memory = True
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'AUTOCOMPLETE_TTL', 300)
+
+    @property
+    def max_names(self):
+        return getattr(settings, 'AUTOCOMPLETE_MAX_NAMES', 200000)
+
+    def _entries(self, name):
+        chave = normalize(name)
+        palavras = chave.split()
+        return [(' '.join(palavras[i:]), name) for i in range(len(palavras))]
+
+    def load(self):
+        nomes = dict(
+            Gasto.objects.order_by()
+            .values_list('name')
+            .annotate(quantidade=Count('id'))[:self.max_names + 1]
+        )
+        with self._lock:
+            self._loaded_at = time.monotonic()
+            if len(nomes) > self.max_names:
+                self._in_memory = False
+                self._keys, self._names = None, {}
+                return
+            keys = []
+            for nome in nomes:
+                keys.extend(self._entries(nome))
+            keys.sort()
+            self._keys, self._names, self._in_memory = keys, nomes, True
+
+    def invalidate(self):
+        with self._lock:
+            self._keys = None
+            self._loaded_at = 0
+
+    def add(self, name, count=1):
+        """Conta ``count`` gastos novos com o nome, sem recarregar o índice."""
+        with self._lock:
+            if self._keys is None:
+                return
+            if name in self._names:
+                self._names[name] += count
+                return
+            self._names[name] = count
+            for entry in self._entries(name):
+                insort(self._keys, entry)
+
+    def remove(self, name):
+        """Desconta um gasto com o nome; sem nenhum, o nome sai do índice."""
+        with self._lock:
+            if self._keys is None or name not in self._names:
+                return
+            self._names[name] -= 1
+            if self._names[name] > 0:
+                return
+            del self._names[name]
+            for entry in self._entries(name):
+                i = bisect_left(self._keys, entry)
+                if i < len(self._keys) and self._keys[i] == entry:
+                    del self._keys[i]
+
+    def _expired(self):
+        return time.monotonic() - self._loaded_at > self.ttl
+
+    def suggest(self, term):
+        if self._expired() or (self._in_memory and self._keys is None):
+            self.load()
+        if not self._in_memory:
+            return suggest_from_db(term, self.limit)
+
+        term = normalize(term)
+        keys = self._keys
+        resultado = []
+        vistos = set()
+        i = bisect_left(keys, (term, ''))
+        while i < len(keys) and len(resultado) < self.limit:
+            chave, nome = keys[i]
+            if not chave.startswith(term):
+                break
+            if nome not in vistos:
+                vistos.add(nome)
+                resultado.append(nome)
+            i += 1
+        return sorted(resultado, key=normalize)
+
+
+def suggest_from_db(term, limit=LIMIT):
+    qs = Gasto.objects.order_by()
+    if term:
+        qs = qs.filter(name__icontains=term)
+    return list(qs.values_list('name', flat=True).distinct().order_by('name')[:limit])
+
+
+name_index = NameIndex()
+
+
+def suggest(term):
+    return name_index.suggest(term)
+
+
+# SINAIS
+# ----------------------------------------------
+
+def gasto_pre_save(sender, instance, raw=False, **kwargs):
+    # Linha antiga lida por summary.gasto_pre_save, ligado antes deste sinal
+    # (website.apps): (segmento_id, datagasto, valor, name).
+    old = getattr(instance, '_summary_old', None)
+    instance._autocomplete_old_name = old[3] if old else None
+
+
+def gasto_post_save(sender, instance, raw=False, created=False, **kwargs):
+    if raw:
+        return
+    antigo = getattr(instance, '_autocomplete_old_name', None)
+    instance._autocomplete_old_name = None
+    if created or antigo is None:
+        name_index.add(instance.name)
+    elif antigo != instance.name:
+        name_index.remove(antigo)
+        name_index.add(instance.name)
+
+
+def gasto_post_delete(sender, instance, **kwargs):
+    name_index.remove(instance.name)
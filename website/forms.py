@@ -12,9 +12,11 @@ from crispy_forms.layout import (
 )
 from crispy_forms.bootstrap import InlineField, FormActions
 from django_select2.forms import ModelSelect2Widget
+from django.utils import formats
 from django.utils.encoding import force_text
 from django.utils.translation import ugettext_lazy as _
 from django.forms.models import inlineformset_factory
+from utils import parse_decimal_br
 
 class MyDateInput(forms.DateInput):
     input_type = 'date'
@@ -26,6 +28,27 @@ class BaseMeta:
     exclude = ('deleted', 'status')
 
 
+class MoneyField(forms.DecimalField):
+    """
+    Campo monetário que aceita o valor digitado no padrão brasileiro
+    (com a máscara '000.000,00' dos scripts) e entrega um Decimal.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_digits', 12)
+        kwargs.setdefault('decimal_places', 2)
+        kwargs.setdefault('localize', True)
+        super().__init__(**kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            value = parse_decimal_br(value)
+        except ValueError:
+            raise forms.ValidationError(self.error_messages['invalid'], code='invalid')
+        return super().to_python(value)
+
 class GastoCustomTitleWidget(ModelSelect2Widget):
     model = Gasto
     search_fields = [
@@ -61,6 +84,10 @@ class GastoForm(forms.ModelForm):
 
     class Meta(BaseMeta):
         model = Gasto
+        field_classes = {
+            'valor': MoneyField,
+            'valor_da_parcela': MoneyField,
+        }
 
 
     def __init__(self, *args, **kwargs):
@@ -121,7 +148,7 @@ class RabbiitForm(forms.ModelForm):
         model = Rabbiit
         fields = ['description', 'rate_hour',
                   'time_end', 'time_start',
-                  'time_total', 'rate_total',
+                  'duration',
                   ]
 
     def __init__(self, *args, **kwargs):
@@ -130,14 +157,14 @@ class RabbiitForm(forms.ModelForm):
         self.helper.form_tag = False
         self.fields['time_start'].widget = forms.HiddenInput()
         self.fields['time_end'].widget = forms.HiddenInput()
-        self.fields['time_total'].widget = forms.HiddenInput()
+        self.fields['duration'].widget = forms.HiddenInput()
 
         self.helper.layout = Layout(
             'description',
             'rate_hour',
             'time_end',
             'time_start',
-            'time_total',
+            'duration',
             Div(
                 Button('start_timer',
                        'Start',
@@ -163,16 +190,6 @@ class RabbiitForm(forms.ModelForm):
             )
         )
 
-    def save(self, commit=True):
-        o = super(RabbiitForm, self).save(commit=False)
-        t_tempo = self.cleaned_data['time_total'].minute
-        price = float(self.cleaned_data['rate_hour'].price.replace(',', '.'))
-        result = t_tempo / 60 * price
-        self.instance.rate_total = result
-        if commit:
-            o.save()
-        return o
-
 
 class HoraTrabalhadaForm(forms.ModelForm):
     # content = forms.CharField(
@@ -185,6 +202,7 @@ class HoraTrabalhadaForm(forms.ModelForm):
     class Meta:
         model = HoraTrabalhada
         exclude = ['status']
+        field_classes = {'price': MoneyField}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -219,8 +237,7 @@ class PecasForm(forms.ModelForm):
                 css_class='form-row'
             ),
             Row(
-                Column('city', css_class='form-group col-md-6 mb-0'),
-                Column('total', css_class='form-group col-md-6 mb-0'),
+                Column('city', css_class='form-group col-md-12 mb-0'),
                 css_class='form-row'
             )
         )
@@ -231,10 +248,14 @@ class PecasForm(forms.ModelForm):
 
 class ItensPecasForm(forms.ModelForm):
 
-    # subtotal = forms.CharField(widget=forms.TextInput(attrs={'readonly': 'readonly'}))
+    # Só exibição: o subtotal é calculado no Itenspecas.save()
+    subtotal = forms.CharField(label='Sub-Total', required=False, disabled=True)
 
     def __init__(self, *args, **kwargs):
         super(ItensPecasForm, self).__init__(*args, **kwargs)
+        if self.instance.subtotal is not None:
+            self.fields['subtotal'].initial = formats.number_format(
+                self.instance.subtotal, 2, force_grouping=True)
         self.helper = FormHelper(self)
         self.helper.form_tag = False
 
@@ -261,6 +282,9 @@ class ItensPecasForm(forms.ModelForm):
 
     class Meta(BaseMeta):
         model = Itenspecas
+        field_classes = {
+            'price': MoneyField,
+        }
 
 ItemPecasFormSet = inlineformset_factory(
     Pecas, Itenspecas, form=ItensPecasForm,
@@ -297,6 +321,39 @@ class ComercioForm(forms.ModelForm):
 
 ItemPecasFormSet = inlineformset_factory(
     Pecas, Itenspecas, form=ItensPecasForm,
-    fields=['description', 'pecas', 'price', 'quantity', 'subtotal'],
+    fields=['description', 'pecas', 'price', 'quantity'],
     extra=1, can_delete=True
 )
+
+
+class ImportarExtratoForm(forms.Form):
+    arquivo = forms.FileField(label='Extrato (CSV ou OFX)')
+    formato = forms.ChoiceField(
+        label='Formato', required=False,
+        choices=[('', 'Detectar'), ('csv', 'CSV'), ('ofx', 'OFX')]
+    )
+    segmento = forms.ModelChoiceField(
+        label='Segmento padrão', queryset=Segmento.objects.all(), required=False,
+        help_text='Usado nos lançamentos sem categoria ou com categoria desconhecida.'
+    )
+    todos = forms.BooleanField(label='Importar também os créditos', required=False)
+
+    def __init__(self, *args, **kwargs):
+        super(ImportarExtratoForm, self).__init__(*args, **kwargs)
+        self.helper = FormHelper(self)
+        self.helper.layout = Layout(
+            Row(
+                Column('arquivo', css_class='form-group col-md-6 mb-0'),
+                Column('formato', css_class='form-group col-md-6 mb-0'),
+            ),
+            Row(
+                Column('segmento', css_class='form-group col-md-6 mb-0'),
+                Column('todos', css_class='form-group col-md-6 mb-0'),
+            ),
+            Div(
+                FormActions(
+                    Submit('submit', _('Importar'), css_class='btn btn-primary'),
+                    css_class="col-md-12"
+                )
+            )
+        )
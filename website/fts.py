@@ -0,0 +1,47 @@
+# coding=utf-8
+"""
+Triggers da busca textual no SQLite (tabelas FTS5 criadas na migration
+0013).
+
+Toda migration que recria website_gasto ou website_segmento no SQLite
+(AddField, AlterField, RemoveField...) apaga os triggers que mantêm as
+tabelas ``<tabela>_fts``, e a busca passa a não achar as linhas novas sem
+erro nenhum. ``recriar_triggers`` roda no post_migrate: se faltar algum
+trigger, recria os que faltam e reconstrói o índice a partir da tabela, o
+que cobre também as linhas gravadas enquanto eles não existiam.
+
+No PostgreSQL o ALTER TABLE mantém os triggers do search_vector.
+"""
+import importlib
+
+from django.db import connections
+
+SUFIXOS = ('ai', 'ad', 'au')
+
+
+def _busca():
+    return importlib.import_module('website.migrations.0013_search_vectors')
+
+
+def triggers_faltando(connection):
+    """Triggers das tabelas FTS5 existentes que não estão no banco."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existentes = set(cursor.fetchall())
+    faltando = []
+    for tabela in _busca().TABLES:
+        if ('table', tabela + '_fts') not in existentes:
+            continue
+        faltando.extend(
+            '{}_fts_{}'.format(tabela, sufixo) for sufixo in SUFIXOS
+            if ('trigger', '{}_fts_{}'.format(tabela, sufixo)) not in existentes
+        )
+    return faltando
+
+
+def recriar_triggers(sender, using='default', **kwargs):
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not triggers_faltando(connection):
+        return
+    with connection.schema_editor() as schema_editor:
+        _busca().create_sqlite(schema_editor)
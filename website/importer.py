@@ -0,0 +1,340 @@
+# coding=utf-8
+"""
+Importação de extratos bancários (CSV ou OFX) para Gasto.
+
+O arquivo é lido aos poucos e processado em lotes: cada lote é validado,
+tem as categorias mapeadas para Segmento, descarta os lançamentos cujo
+``content_hash`` já existe e é gravado com um bulk_create. Como o
+bulk_create não dispara sinais, o resumo mensal e o autocomplete recebem
+os gastos criados de cada lote aqui mesmo.
+"""
+import csv
+import hashlib
+import io
+import re
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+
+from utils import parse_decimal_br, remover_acentos
+from .models import Gasto, Segmento, MONEY_MAX_DIGITS, MONEY_DECIMAL_PLACES
+from . import autocomplete, summary
+
+BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+
+CENTAVOS = Decimal(10) ** -MONEY_DECIMAL_PLACES
+VALOR_MAXIMO = Decimal(10) ** (MONEY_MAX_DIGITS - MONEY_DECIMAL_PLACES)
+NAME_MAX_LENGTH = Gasto._meta.get_field('name').max_length
+
+FORMATO_DATA = ('%d/%m/%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%Y', '%Y%m%d')
+
+# Cabeçalhos aceitos no CSV (sem acento e em minúsculas)
+COLUNAS_CSV = {
+    'data': ('data', 'date', 'data lancamento', 'data do lancamento', 'dt'),
+    'nome': ('descricao', 'description', 'nome', 'name', 'historico',
+             'lancamento', 'estabelecimento', 'memo'),
+    'valor': ('valor', 'value', 'amount', 'valor (r$)', 'quantia'),
+    'categoria': ('categoria', 'category', 'segmento'),
+}
+
+# "LOJA X 03/10", "LOJA X PARC 03/10", "LOJA X PARCELA 3/10"
+PARCELA_RE = re.compile(r'\s*(?:parc(?:ela)?\.?\s*)?(\d{1,2})\s*/\s*(\d{1,2})\s*$', re.IGNORECASE)
+OFX_TAG_RE = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def normalizar(texto):
+    return ' '.join(remover_acentos(texto or '').lower().split())
+
+
+def content_hash(name, valor, datagasto, nro_da_parcela=1, ocorrencia=1):
+    """
+    Hash de um lançamento. ``ocorrencia`` distingue lançamentos iguais no
+    mesmo extrato (ex.: dois cafés de mesmo valor no mesmo dia), e se
+    repete igual quando o extrato é importado de novo.
+    """
+    chave = '|'.join([
+        normalizar(name), '{:.2f}'.format(valor), datagasto.isoformat(),
+        str(nro_da_parcela), str(ocorrencia),
+    ])
+    return hashlib.sha256(chave.encode('utf-8')).hexdigest()
+
+
+# LEITURA
+# ----------------------------------------------
+
+def abrir_texto(arquivo):
+    """
+    Envolve um arquivo binário (upload ou open(..., 'rb')) num leitor de
+    texto, em UTF-8 ou, se a amostra não for UTF-8, em cp1252 (comum em OFX).
+    """
+    amostra = arquivo.read(CHUNK_SIZE)
+    arquivo.seek(0)
+    try:
+        amostra.decode('utf-8')
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        encoding = 'cp1252'
+    return io.TextIOWrapper(arquivo, encoding=encoding, errors='replace', newline='')
+
+
+def detectar_formato(texto):
+    amostra = texto.read(CHUNK_SIZE)
+    texto.seek(0)
+    if 'OFXHEADER' in amostra or '<OFX>' in amostra.upper():
+        return 'ofx'
+    return 'csv'
+
+
+def ler_csv(texto):
+    """
+    Gera um dicionário por linha do CSV com as chaves linha, data, nome,
+    valor e categoria (textos ainda não validados).
+    """
+    primeira = texto.readline()
+    try:
+        dialect = csv.Sniffer().sniff(primeira, delimiters=';,\t')
+    except csv.Error:
+        dialect = csv.excel
+    cabecalho = [normalizar(coluna) for coluna in next(csv.reader([primeira], dialect), [])]
+    indices = {}
+    for campo, nomes in COLUNAS_CSV.items():
+        for i, coluna in enumerate(cabecalho):
+            if coluna in nomes:
+                indices[campo] = i
+                break
+    faltando = {'data', 'nome', 'valor'} - set(indices)
+    if faltando:
+        raise ValueError('Colunas não encontradas no CSV: {}'.format(', '.join(sorted(faltando))))
+
+    for numero, row in enumerate(csv.reader(texto, dialect), start=2):
+        if not any(row):
+            continue
+        registro = {'linha': numero}
+        for campo, i in indices.items():
+            registro[campo] = row[i] if i < len(row) else ''
+        yield registro
+
+
+def _ofx_tags(texto):
+    """Gera (fecha, tag, valor) das tags do OFX, lendo o arquivo em pedaços."""
+    resto = ''
+    for pedaco in iter(lambda: texto.read(CHUNK_SIZE), ''):
+        resto += pedaco
+        corte = resto.rfind('<')
+        if corte <= 0:
+            continue
+        for match in OFX_TAG_RE.finditer(resto, 0, corte):
+            yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+        resto = resto[corte:]
+    for match in OFX_TAG_RE.finditer(resto):
+        yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+
+
+def ler_ofx(texto):
+    """Gera um dicionário por <STMTTRN> do OFX (SGML ou XML)."""
+    atual = None
+    numero = 0
+    for fecha, tag, valor in _ofx_tags(texto):
+        if tag == 'STMTTRN':
+            if fecha and atual is not None:
+                yield {
+                    'linha': numero,
+                    'data': atual.get('DTPOSTED', '')[:8],
+                    'nome': atual.get('NAME') or atual.get('MEMO', ''),
+                    'valor': atual.get('TRNAMT', ''),
+                    'categoria': '',
+                }
+                atual = None
+            elif not fecha:
+                numero += 1
+                atual = {}
+        elif atual is not None and not fecha and valor:
+            atual[tag] = valor
+
+
+LEITORES = {
+    'csv': ler_csv,
+    'ofx': ler_ofx,
+}
+
+
+# IMPORTAÇÃO
+# ----------------------------------------------
+
+class ResultadoImportacao:
+
+    def __init__(self):
+        self.lidos = 0
+        self.criados = 0
+        self.duplicados = 0
+        self.ignorados = 0
+        self.erros = []
+
+    @property
+    def invalidos(self):
+        return len(self.erros)
+
+    def __str__(self):
+        return ('{} lidos, {} criados, {} duplicados, {} créditos ignorados, '
+                '{} inválidos'.format(self.lidos, self.criados, self.duplicados,
+                                      self.ignorados, self.invalidos))
+
+
+class GastoImporter:
+    """
+    Importa lançamentos de extrato como Gasto.
+
+    As categorias do extrato são comparadas (sem acento e sem caixa) com o
+    nome e o slug dos segmentos; as que não baterem vão para
+    ``segmento_padrao``. Por padrão só os débitos (valores negativos) são
+    importados, com o valor positivo; com ``apenas_debitos=False`` todos os
+    lançamentos entram pelo valor absoluto.
+    """
+
+    def __init__(self, segmento_padrao=None, apenas_debitos=True,
+                 batch_size=BATCH_SIZE, dry_run=False):
+        self.segmento_padrao = segmento_padrao
+        self.apenas_debitos = apenas_debitos
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self._segmentos = None
+        self._ocorrencias = Counter()
+
+    def segmentos(self):
+        if self._segmentos is None:
+            self._segmentos = {}
+            for segmento_id, name, slug in Segmento.objects.values_list('id', 'name', 'slug'):
+                self._segmentos.setdefault(normalizar(name), segmento_id)
+                self._segmentos.setdefault(normalizar(slug), segmento_id)
+        return self._segmentos
+
+    def importar(self, arquivo, formato=None):
+        """Importa um arquivo binário. Retorna um ResultadoImportacao."""
+        texto = abrir_texto(arquivo)
+        try:
+            formato = formato or detectar_formato(texto)
+            return self.importar_registros(LEITORES[formato](texto))
+        finally:
+            texto.detach()
+
+    def importar_registros(self, registros):
+        resultado = ResultadoImportacao()
+        # As ocorrências contam lançamentos iguais dentro de um mesmo extrato
+        self._ocorrencias = Counter()
+        registros = iter(registros)
+        while True:
+            lote = list(islice(registros, self.batch_size))
+            if not lote:
+                return resultado
+            resultado.lidos += len(lote)
+            gastos = []
+            for registro in lote:
+                try:
+                    gasto = self.validar(registro)
+                except ValueError as erro:
+                    resultado.erros.append((registro['linha'], str(erro)))
+                    continue
+                if gasto is None:
+                    resultado.ignorados += 1
+                else:
+                    gastos.append(gasto)
+            criados = self.gravar(gastos)
+            resultado.criados += criados
+            resultado.duplicados += len(gastos) - criados
+
+    def validar(self, registro):
+        """
+        Converte um registro lido em Gasto (não gravado). Retorna None para
+        créditos ignorados e levanta ValueError se o registro for inválido.
+        """
+        datagasto = _parse_data(registro.get('data', ''))
+        if datagasto is None:
+            raise ValueError('data inválida: {!r}'.format(registro.get('data', '')))
+
+        try:
+            valor = parse_decimal_br(registro.get('valor', ''))
+        except ValueError:
+            raise ValueError('valor inválido: {!r}'.format(registro.get('valor', '')))
+        if self.apenas_debitos and valor >= 0:
+            return None
+        valor = abs(valor).quantize(CENTAVOS)
+        if not valor:
+            return None
+
+        name = ' '.join((registro.get('nome') or '').split())
+        nro_da_parcela, parcelas = 1, 1
+        match = PARCELA_RE.search(name)
+        if match and 1 <= int(match.group(1)) <= int(match.group(2)):
+            nro_da_parcela, parcelas = int(match.group(1)), int(match.group(2))
+            name = name[:match.start()].strip()
+        name = name[:NAME_MAX_LENGTH]
+        if not name:
+            raise ValueError('descrição vazia')
+
+        total = valor * parcelas
+        if total >= VALOR_MAXIMO:
+            raise ValueError('valor fora do limite: {}'.format(total))
+
+        categoria = normalizar(registro.get('categoria', ''))
+        segmento_id = self.segmentos().get(categoria) if categoria else None
+        if segmento_id is None:
+            if self.segmento_padrao is None:
+                raise ValueError('categoria sem segmento: {!r}'.format(registro.get('categoria', '')))
+            segmento_id = self.segmento_padrao.pk
+
+        chave = (normalizar(name), valor, datagasto, nro_da_parcela)
+        self._ocorrencias[chave] += 1
+        return Gasto(
+            name=name,
+            slug=slugify(name)[:100],
+            parcelas=parcelas,
+            nro_da_parcela=nro_da_parcela,
+            valor=total,
+            valor_da_parcela=valor,
+            datagasto=datagasto,
+            segmento_id=segmento_id,
+            content_hash=content_hash(name, valor, datagasto, nro_da_parcela,
+                                      self._ocorrencias[chave]),
+        )
+
+    def gravar(self, gastos):
+        """Grava os gastos que ainda não existem. Retorna quantos foram criados."""
+        if not gastos:
+            return 0
+        hashes = [gasto.content_hash for gasto in gastos]
+        for tentativa in range(2):
+            existentes = set(
+                Gasto.objects.filter(content_hash__in=hashes)
+                .values_list('content_hash', flat=True)
+            )
+            novos = [gasto for gasto in gastos if gasto.content_hash not in existentes]
+            if self.dry_run or not novos:
+                return len(novos)
+            try:
+                with transaction.atomic():
+                    Gasto.objects.bulk_create(novos)
+                    summary.apply_gastos(novos)
+                break
+            except IntegrityError:
+                # Outra importação gravou parte do lote entre a consulta e o
+                # INSERT: consulta de novo e grava o que sobrou
+                if tentativa:
+                    raise
+        for name, quantidade in Counter(gasto.name for gasto in novos).items():
+            autocomplete.name_index.add(name, quantidade)
+        return len(novos)
+
+
+def _parse_data(texto):
+    texto = (texto or '').strip()
+    for formato in FORMATO_DATA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    return None
@@ -0,0 +1,94 @@
+# coding=utf-8
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from vendor.cruds_adminlte import advisor
+from website.models import Gasto, Segmento, Pecas
+from website.reports import GastoPorMesReport
+
+
+def report_cases():
+    """Consultas representativas dos relatórios e telas fora dos CRUDViews."""
+    segmento_id = advisor.sample_value(Gasto, 'segmento')
+    slug = advisor.sample_value(Segmento, 'slug')
+    report = GastoPorMesReport(segmento_id, date(date.today().year - 1, 1, 1), date.today())
+    detalhe = report.get_queryset().order_by('-datagasto', '-id')[:report.paginate_by]
+    return [
+        advisor.QueryCase(
+            'gastosPorMes detalhe', detalhe,
+            equality=['segmento'], ranges=['datagasto'], ordering=['-datagasto', '-id']),
+        advisor.QueryCase(
+            'gastosPorMes meses', report.get_queryset().order_by().values('datagasto'),
+            equality=['segmento'], ranges=['datagasto']),
+        advisor.QueryCase(
+            'gastosPorSegmento segmento', Segmento.objects.filter(slug=slug),
+            equality=['slug']),
+        advisor.QueryCase(
+            'gastosPorSegmento gastos', Gasto.objects.filter(segmento_id=segmento_id).order_by('-id')[:5],
+            equality=['segmento'], ordering=['-id']),
+        advisor.QueryCase(
+            'autocomplete', Gasto.objects.filter(name__icontains='ab').values('name').distinct()[:10],
+            text=['name']),
+        advisor.QueryCase(
+            'pecas por período',
+            Pecas.objects.filter(Q(data__gte=date(date.today().year, 1, 1))).order_by('-data', '-id')[:10],
+            ranges=['data'], ordering=['-data', '-id']),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Roda EXPLAIN nas consultas das listas dos CRUDViews (ordenação, list_filter, '
+            'related_fields, search_fields) e dos relatórios, aponta leituras completas da '
+            'tabela e sugere índices. Com --write gera as migrations. Em tabelas pequenas o '
+            'banco pode preferir ler a tabela inteira mesmo com índice: rode com dados reais.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--write', action='store_true',
+                            help='Gera uma migration por app com os índices sugeridos.')
+        parser.add_argument('--plans', action='store_true',
+                            help='Mostra o plano de cada consulta.')
+
+    def handle(self, *args, **options):
+        cases = []
+        for view_class, model in advisor.crud_list_views():
+            cases += advisor.list_view_cases(view_class, model)
+        cases += report_cases()
+        advisor.analyze(cases)
+
+        for case in cases:
+            flags = []
+            if case.seq_scan:
+                flags.append('leitura completa')
+            if case.sort:
+                flags.append('ordenação')
+            if case.text:
+                flags.append('busca textual (use search_backend)')
+            status = ', '.join(flags) or 'ok'
+            self.stdout.write('{}: {}'.format(case.label, status))
+            if options['plans']:
+                for linha in case.plan.splitlines():
+                    self.stdout.write('    ' + linha)
+            if case.index is not None:
+                self.stdout.write(self.style.WARNING('    sugerido: {}'.format(self.describe(case.index))))
+
+        indexes = advisor.unique_indexes(cases)
+        if not indexes:
+            self.stdout.write(self.style.SUCCESS('Nenhum índice a sugerir.'))
+            return
+        if not options['write']:
+            self.stdout.write('Use --write para gerar as migrations.')
+            return
+        for path in advisor.write_migrations(indexes):
+            self.stdout.write(self.style.SUCCESS('Migration gerada: {}'.format(path)))
+        self.stdout.write('Inclua os índices em Meta.indexes dos modelos:')
+        for model, model_indexes in indexes.items():
+            for index in model_indexes:
+                self.stdout.write('    {}: {}'.format(model.__name__, self.describe(index)))
+
+    def describe(self, index):
+        partes = ['fields={!r}'.format(list(index.fields)), 'name={!r}'.format(index.name)]
+        if index.condition is not None:
+            partes.append('condition={!r}'.format(index.condition))
+        return 'models.Index({})'.format(', '.join(partes))
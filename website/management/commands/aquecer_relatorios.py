@@ -0,0 +1,35 @@
+# coding=utf-8
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from utils import month_start
+from website import report_cache
+from website.models import Segmento
+from website.reports import GastoPorMesReport
+
+
+class Command(BaseCommand):
+    help = ('Calcula e guarda no cache o relatório de gastos por mês do mês atual '
+            'e do anterior de cada segmento. Rode depois do deploy para que os '
+            'primeiros acessos não calculem os relatórios.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--segmento', type=int, action='append',
+                            help='Id do segmento (pode repetir; padrão: todos).')
+
+    def handle(self, *args, **options):
+        hoje = date.today()
+        inicio_mes = month_start(hoje)
+        fim_anterior = inicio_mes - timedelta(days=1)
+        periodos = [(month_start(fim_anterior), fim_anterior), (inicio_mes, hoje)]
+
+        segmentos = Segmento.objects.order_by('id').values_list('id', flat=True)
+        if options['segmento']:
+            segmentos = segmentos.filter(id__in=options['segmento'])
+        total = 0
+        for segmento_id in segmentos:
+            for dt_inicial, dt_final in periodos:
+                report_cache.warm(GastoPorMesReport(segmento_id, dt_inicial, dt_final))
+                total += 1
+        self.stdout.write(self.style.SUCCESS('{} relatórios no cache.'.format(total)))
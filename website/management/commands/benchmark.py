@@ -0,0 +1,272 @@
+# coding=utf-8
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from vendor.cruds_adminlte import cache as crud_cache
+from website.models import Segmento, Gasto, Rabbiit, Pecas, Comercio, City
+from website.seed import PREFIXO
+
+
+class Rollback(Exception):
+    pass
+
+
+def amostras():
+    """Valores reais do banco usados nos parâmetros dos cenários."""
+    segmento = (Segmento.objects.filter(slug__startswith=PREFIXO + '-').first()
+                or Segmento.objects.order_by('id').first())
+    nome = (Gasto.objects.filter(segmento=segmento).values_list('name', flat=True).first()
+            if segmento else None) or 'a'
+    return {
+        'segmento': segmento,
+        'termo': nome.split()[0][:4],
+        'pecas': Pecas.objects.order_by('-id').first(),
+        'comercio': Comercio.objects.order_by('id').first(),
+        'city': City.objects.order_by('id').first(),
+    }
+
+
+def dados_pecas(dados, pecas=None):
+    """POST do formulário de peças com o formset de itens."""
+    post = {
+        'data': '2020-01-15', 'veiculo': 'C', 'proxtroca': 15000, 'troca': 10000,
+        'comercio': dados['comercio'].pk, 'city': dados['city'].pk,
+        'itenspecas_set-INITIAL_FORMS': 0, 'itenspecas_set-MIN_NUM_FORMS': 0,
+        'itenspecas_set-MAX_NUM_FORMS': 1000,
+    }
+    itens = list(pecas.itenspecas_set.order_by('id')) if pecas else []
+    for i, item in enumerate(itens):
+        post.update({
+            'itenspecas_set-%d-id' % i: item.pk,
+            'itenspecas_set-%d-pecas' % i: pecas.pk,
+            'itenspecas_set-%d-description' % i: item.description,
+            'itenspecas_set-%d-price' % i: str(item.price).replace('.', ','),
+            'itenspecas_set-%d-quantity' % i: item.quantity,
+        })
+    novo = len(itens)
+    post.update({
+        'itenspecas_set-%d-description' % novo: 'Filtro de óleo',
+        'itenspecas_set-%d-price' % novo: '35,90',
+        'itenspecas_set-%d-quantity' % novo: 2,
+        'itenspecas_set-TOTAL_FORMS': novo + 1,
+        'itenspecas_set-INITIAL_FORMS': len(itens),
+    })
+    if pecas:
+        post['itenspecas_set-%d-pecas' % novo] = pecas.pk
+    return post
+
+
+def cenarios(dados):
+    """
+    (nome, método, url, dados do POST, status esperado, models invalidados).
+    Os POSTs rodam numa transação desfeita no fim, então o banco não muda
+    entre execuções. As listas com page_cache trocam o token dos models
+    invalidados antes de cada execução (fora da medida) e medem a página
+    renderizada; os cenários ``*_cache`` medem a página vinda do cache.
+    """
+    segmento = dados['segmento']
+    pecas = dados['pecas']
+    gastos = reverse('website_gasto_list')
+    segmentos = reverse('website_segmento_list')
+    lista = [
+        ('gasto_list', 'get', gastos, None, 200, (Gasto,)),
+        ('gasto_list_cache', 'get', gastos, None, 200, ()),
+        ('gasto_search', 'get', '{}?q={}'.format(gastos, dados['termo']), None, 200, (Gasto,)),
+        ('segmento_list', 'get', segmentos, None, 200, (Segmento,)),
+        ('segmento_list_cache', 'get', segmentos, None, 200, ()),
+        ('segmento_search', 'get', '{}?q={}'.format(
+            segmentos, segmento.name[:4] if segmento else 'a'), None, 200, (Segmento,)),
+        ('rabbiit_list', 'get', reverse('website_rabbiit_list'), None, 200, (Rabbiit,)),
+        ('autocomplete', 'get', '/gasto/autocomplete/?term={}'.format(dados['termo'][:3]), None, 200, ()),
+        ('pecas_list', 'get', reverse('website_pecas_list'), None, 200, ()),
+    ]
+    if segmento is not None:
+        lista += [
+            ('gasto_list_segmento', 'get', '{}?segmento={}'.format(gastos, segmento.pk), None, 200,
+             (Gasto,)),
+            ('gastos_por_mes', 'get', '/gastosPorMes/?segmento_id={}&dtInicial=01/01/2000'.format(
+                segmento.pk), None, 200, ()),
+        ]
+    if dados['comercio'] is not None and dados['city'] is not None:
+        lista.append(('pecas_create', 'post', reverse('website_pecas_create'), dados_pecas(dados),
+                      302, ()))
+        if pecas is not None:
+            editar = reverse('website_pecas_edit', args=[pecas.pk])
+            lista += [
+                ('pecas_edit_form', 'get', editar, None, 200, ()),
+                ('pecas_edit', 'post', editar, dados_pecas(dados, pecas), 302, ()),
+            ]
+    return lista
+
+
+def versao_banco():
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SHOW server_version')
+        elif connection.vendor == 'sqlite':
+            cursor.execute('SELECT sqlite_version()')
+        else:
+            return None
+        return cursor.fetchone()[0]
+
+
+def commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=str(settings.BASE_DIR),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Mede as páginas mais usadas (listas e buscas dos CRUDs, gastosPorMes, '
+            'autocomplete, criação e edição de peças) com o cliente de teste do Django '
+            'e o banco configurado. Saída em JSON; use --compare para comparar com '
+            'a saída de outro commit. Gere os dados antes com gerar_dados.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=20,
+                            help='Execuções medidas por cenário (padrão: 20).')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Execuções descartadas antes de medir (padrão: 3).')
+        parser.add_argument('--usuario',
+                            help='Usuário logado nas requisições (padrão: o primeiro superusuário).')
+        parser.add_argument('--cenario', action='append',
+                            help='Roda só este cenário (pode repetir).')
+        parser.add_argument('--output', help='Grava o JSON neste arquivo.')
+        parser.add_argument('--compare', help='JSON de uma execução anterior para comparar.')
+        parser.add_argument('--tolerancia', type=float, default=20,
+                            help='Com --compare, falha se a mediana de algum cenário '
+                                 'piorar mais que este percentual (padrão: 20).')
+
+    def handle(self, *args, **options):
+        usuario = self.get_usuario(options['usuario'])
+        dados = amostras()
+        lista = cenarios(dados)
+        if options['cenario']:
+            desconhecidos = set(options['cenario']) - {c[0] for c in lista}
+            if desconhecidos:
+                raise CommandError('Cenário desconhecido: {}'.format(', '.join(sorted(desconhecidos))))
+            lista = [c for c in lista if c[0] in options['cenario']]
+
+        # Sem DEBUG: nada de debug toolbar nem de SQL guardado em connection.queries
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver']):
+            client = Client()
+            client.force_login(usuario)
+            resultados = {}
+            for nome, metodo, url, post, status, invalidar in lista:
+                resultados[nome] = self.medir(client, metodo, url, post, status, invalidar, options)
+                self.stderr.write('{}: {:.2f} ms'.format(nome, resultados[nome]['median_ms']))
+
+        result = {
+            'commit': commit_atual(),
+            'vendor': connection.vendor,
+            'database_version': versao_banco(),
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'rows': {
+                model._meta.model_name: model.objects.count()
+                for model in (Segmento, Gasto, Rabbiit, Pecas)
+            },
+            'runs': options['runs'],
+            'scenarios': resultados,
+        }
+        output = json.dumps(result, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
+        if options['compare']:
+            self.comparar(result, options['compare'], options['tolerancia'])
+
+    def get_usuario(self, username):
+        User = get_user_model()
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError('Usuário não encontrado: {}'.format(username))
+        usuario = User.objects.filter(is_superuser=True, is_active=True).order_by('pk').first()
+        if usuario is None:
+            raise CommandError('Nenhum superusuário: crie um com createsuperuser ou use --usuario.')
+        return usuario
+
+    def requisicao(self, client, metodo, url, post, status, invalidar):
+        if invalidar:
+            # Fora de transação o touch é imediato: a página é renderizada de novo
+            crud_cache.touch(*invalidar)
+        consultas = [0]
+
+        def contar(execute, sql, params, many, context):
+            consultas[0] += 1
+            return execute(sql, params, many, context)
+
+        try:
+            with transaction.atomic(), connection.execute_wrapper(contar):
+                inicio = time.perf_counter()
+                response = getattr(client, metodo)(url, post) if post else getattr(client, metodo)(url)
+                duracao = time.perf_counter() - inicio
+                if post:
+                    raise Rollback
+        except Rollback:
+            pass
+        if response.status_code != status:
+            raise CommandError('{} {} retornou {} (esperado {})'.format(
+                metodo.upper(), url, response.status_code, status))
+        return duracao, consultas[0], len(response.content)
+
+    def medir(self, client, metodo, url, post, status, invalidar, options):
+        for _ in range(options['warmup']):
+            self.requisicao(client, metodo, url, post, status, invalidar)
+        tempos = []
+        for _ in range(options['runs']):
+            duracao, consultas, tamanho = self.requisicao(client, metodo, url, post, status, invalidar)
+            tempos.append(duracao * 1000)
+        tempos.sort()
+        return {
+            'method': metodo.upper(),
+            'url': url,
+            'median_ms': round(statistics.median(tempos), 3),
+            'p95_ms': round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 3),
+            'min_ms': round(tempos[0], 3),
+            'mean_ms': round(statistics.mean(tempos), 3),
+            'queries': consultas,
+            'response_bytes': tamanho,
+        }
+
+    def comparar(self, atual, caminho, tolerancia):
+        try:
+            with open(caminho) as f:
+                anterior = json.load(f)
+        except (OSError, ValueError) as erro:
+            raise CommandError('{}: {}'.format(caminho, erro))
+        pioraram = []
+        for nome, medida in sorted(atual['scenarios'].items()):
+            base = anterior.get('scenarios', {}).get(nome)
+            if not base:
+                continue
+            variacao = (medida['median_ms'] / base['median_ms'] - 1) * 100 if base['median_ms'] else 0
+            linha = '{}: {:.2f} -> {:.2f} ms ({:+.1f}%), consultas {} -> {}'.format(
+                nome, base['median_ms'], medida['median_ms'], variacao,
+                base['queries'], medida['queries'])
+            if variacao > tolerancia:
+                pioraram.append(nome)
+                self.stderr.write(self.style.ERROR(linha))
+            else:
+                self.stderr.write(linha)
+        if pioraram:
+            raise CommandError('Pioraram mais de {}% em relação a {} ({}): {}'.format(
+                tolerancia, caminho, anterior.get('commit'), ', '.join(pioraram)))
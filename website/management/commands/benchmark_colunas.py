@@ -0,0 +1,118 @@
+# coding=utf-8
+import gc
+import importlib.util
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from website import columnar
+from website.models import Gasto
+
+# Colunas de Gasto usadas nos relatórios e o tipo de cada uma
+TIPOS = {
+    'datagasto': 'datetime64[D]',
+    'valor': columnar.CENTAVOS,
+    'segmento_id': columnar.CATEGORIA,
+    'parcelas': 'int64',
+    'nro_da_parcela': 'int64',
+}
+
+
+def read_frame(queryset):
+    """read_frame do django_pandas (o antigo to_dataframe) e a conversão para os mesmos tipos."""
+    import pandas as pd
+    from django_pandas import io
+
+    df = io.read_frame(queryset, fieldnames=list(TIPOS))
+    df['datagasto'] = pd.to_datetime(df['datagasto'])
+    df['valor'] = (df['valor'].astype('float64') * 100).round().astype('int64')
+    df['segmento_id'] = df['segmento_id'].astype('category')
+    return df
+
+
+def colunas(queryset, chunk_size):
+    return queryset.to_columns(TIPOS, chunk_size)
+
+
+def colunas_dataframe(queryset, chunk_size):
+    return queryset.to_dataframe(TIPOS, chunk_size=chunk_size)
+
+
+class Command(BaseCommand):
+    help = ('Compara o tempo e o pico de memória (tracemalloc) da leitura de gastos '
+            'em colunas tipadas (website.columnar) com o to_dataframe do '
+            'django_pandas. Saída em JSON. Para 1 milhão de linhas, gere os dados '
+            'antes com gerar_dados.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=1000000,
+                            help='Linhas lidas de Gasto (padrão: 1000000).')
+        parser.add_argument('--runs', type=int, default=3,
+                            help='Execuções medidas por método (padrão: 3).')
+        parser.add_argument('--chunk-size', type=int, default=columnar.CHUNK_SIZE,
+                            help='Linhas por fetchmany (padrão: {}).'.format(columnar.CHUNK_SIZE))
+        parser.add_argument('--output', help='Grava o JSON neste arquivo.')
+
+    def handle(self, *args, **options):
+        queryset = Gasto.objects.order_by()[:options['linhas']]
+        linhas = queryset.count()
+        if not linhas:
+            raise CommandError('Nenhum gasto: gere os dados com gerar_dados.')
+        if linhas < options['linhas']:
+            self.stderr.write('Só {} gastos no banco (pedidas {}).'.format(linhas, options['linhas']))
+
+        metodos = [
+            ('colunas', lambda: colunas(queryset, options['chunk_size'])),
+            ('colunas_dataframe', lambda: colunas_dataframe(queryset, options['chunk_size'])),
+        ]
+        if importlib.util.find_spec('django_pandas'):
+            metodos.insert(0, ('django_pandas', lambda: read_frame(queryset)))
+        else:
+            self.stderr.write('django_pandas não instalado: medindo só as colunas.')
+
+        # Importa pandas antes, para o import não entrar na primeira medida
+        import pandas  # noqa: F401
+
+        resultados = {}
+        for nome, metodo in metodos:
+            resultados[nome] = self.medir(metodo, options['runs'])
+            self.stderr.write('{}: {:.3f} s, pico {:.1f} MB'.format(
+                nome, resultados[nome]['median_s'], resultados[nome]['peak_mb']))
+
+        result = {
+            'rows': linhas,
+            'chunk_size': options['chunk_size'],
+            'runs': options['runs'],
+            'methods': resultados,
+        }
+        output = json.dumps(result, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    def medir(self, metodo, runs):
+        tempos = []
+        for _ in range(runs):
+            gc.collect()
+            inicio = time.perf_counter()
+            resultado = metodo()
+            tempos.append(time.perf_counter() - inicio)
+            del resultado
+
+        # Memória numa execução separada: o tracemalloc deixa tudo mais lento
+        gc.collect()
+        tracemalloc.start()
+        resultado = metodo()
+        atual, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del resultado
+        return {
+            'median_s': round(statistics.median(tempos), 4),
+            'min_s': round(min(tempos), 4),
+            'peak_mb': round(pico / 2 ** 20, 2),
+            'result_mb': round(atual / 2 ** 20, 2),
+        }
@@ -0,0 +1,88 @@
+# coding=utf-8
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Roda num processo novo, como um worker do gunicorn subindo: carrega a
+# aplicação WSGI e o URLconf (que instancia todos os CRUDViews) e mede o
+# tempo, a memória (RSS máximo) e as consultas feitas ao banco.
+WORKER_SNIPPET = '''
+import json, os, resource, sys, time
+t0 = time.perf_counter()
+from django.db import connection
+queries = []
+
+def guard(execute, sql, params, many, context):
+    queries.append(sql)
+    if os.environ.get('BENCHMARK_STARTUP_NO_DB'):
+        raise RuntimeError('Consulta ao banco durante a inicialização: %s' % sql)
+    return execute(sql, params, many, context)
+
+with connection.execute_wrapper(guard):
+    from urban_train.wsgi import application
+    t_wsgi = time.perf_counter()
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+    t_urls = time.perf_counter()
+
+print(json.dumps({
+    'wsgi_seconds': t_wsgi - t0,
+    'urls_seconds': t_urls - t_wsgi,
+    'total_seconds': t_urls - t0,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'queries': len(queries),
+    'modules': len(sys.modules),
+    'pandas_loaded': 'pandas' in sys.modules,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = ('Mede a inicialização de um worker (import da aplicação e do URLconf): '
+            'tempo, RSS e consultas ao banco. Saída em JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Quantidade de processos medidos (padrão: 5).')
+        parser.add_argument('--no-db', action='store_true',
+                            help='Falha se a inicialização consultar o banco.')
+        parser.add_argument('--output', help='Grava o JSON neste arquivo.')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+        if options['no_db']:
+            env['BENCHMARK_STARTUP_NO_DB'] = '1'
+
+        runs = []
+        for _ in range(options['runs']):
+            proc = subprocess.run(
+                [sys.executable, '-c', WORKER_SNIPPET],
+                env=env, cwd=str(settings.BASE_DIR),
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                universal_newlines=True
+            )
+            if proc.returncode != 0:
+                raise CommandError(proc.stderr.strip().splitlines()[-1] if proc.stderr else
+                                   'Worker terminou com código {}'.format(proc.returncode))
+            runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+        result = {
+            'runs': runs,
+            'median': {
+                key: statistics.median(run[key] for run in runs)
+                for key in ('wsgi_seconds', 'urls_seconds', 'total_seconds',
+                            'max_rss_kb', 'queries', 'modules')
+            },
+            'pandas_loaded': any(run['pandas_loaded'] for run in runs),
+        }
+        output = json.dumps(result, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
@@ -0,0 +1,61 @@
+# coding=utf-8
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from website.seed import GeradorDados, PREFIXO, remover_dados
+
+
+class Command(BaseCommand):
+    help = ('Gera dados sintéticos (gastos parcelados, peças com itens e horas '
+            'trabalhadas) para o comando benchmark. Com a mesma semente os dados '
+            'são sempre os mesmos. Os registros levam o prefixo "{}" nos nomes e '
+            'têm os ids registrados: --remover apaga só eles.'.format(PREFIXO))
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', type=float, default=1,
+                            help='Multiplica todas as quantidades (padrão: 1).')
+        parser.add_argument('--gastos', type=int, default=10000,
+                            help='Compras geradas; as parceladas viram várias linhas (padrão: 10000).')
+        parser.add_argument('--pecas', type=int, default=1000,
+                            help='Notas de peças (padrão: 1000).')
+        parser.add_argument('--itens-por-peca', type=int, default=5,
+                            help='Média de itens por nota de peças (padrão: 5).')
+        parser.add_argument('--rabbiits', type=int, default=2000,
+                            help='Registros de horas trabalhadas (padrão: 2000).')
+        parser.add_argument('--anos', type=int, default=3,
+                            help='Período das datas geradas, até hoje (padrão: 3).')
+        parser.add_argument('--semente', type=int, default=42,
+                            help='Semente do gerador aleatório (padrão: 42).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Linhas por bulk_create (padrão: 1000).')
+        parser.add_argument('--remover', action='store_true',
+                            help='Só remove os dados gerados anteriormente.')
+
+    def handle(self, *args, **options):
+        if options['remover']:
+            self.stdout.write(json.dumps({'removidos': remover_dados()}, indent=2))
+            return
+
+        escala = options['escala']
+        quantidades = {
+            nome: int(options[nome] * escala)
+            for nome in ('gastos', 'pecas', 'rabbiits')
+        }
+        if options['itens_por_peca'] < 1 or min(quantidades.values()) < 0:
+            raise CommandError('As quantidades devem ser positivas.')
+
+        inicio = time.perf_counter()
+        gerador = GeradorDados(
+            itens_por_peca=options['itens_por_peca'],
+            anos=options['anos'],
+            semente=options['semente'],
+            batch_size=options['batch_size'],
+            **quantidades
+        )
+        resultado = {
+            'criados': gerador.gerar(),
+            'segundos': round(time.perf_counter() - inicio, 3),
+        }
+        self.stdout.write(json.dumps(resultado, indent=2))
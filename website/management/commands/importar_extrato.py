@@ -0,0 +1,53 @@
+# coding=utf-8
+from django.core.management.base import BaseCommand, CommandError
+
+from website.importer import GastoImporter, BATCH_SIZE, LEITORES
+from website.models import Segmento
+
+
+class Command(BaseCommand):
+    help = ('Importa um extrato bancário (CSV ou OFX) como gastos, em lotes, '
+            'ignorando os lançamentos já importados.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', nargs='+', help='Arquivo(s) de extrato.')
+        parser.add_argument('--formato', choices=sorted(LEITORES),
+                            help='Formato do arquivo (padrão: detectado pelo conteúdo).')
+        parser.add_argument('--segmento',
+                            help='Segmento (id, nome ou slug) dos lançamentos sem categoria conhecida.')
+        parser.add_argument('--todos', action='store_true',
+                            help='Importa também os créditos (por padrão só os débitos).')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Lançamentos por lote (padrão: {}).'.format(BATCH_SIZE))
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Valida e conta os lançamentos sem gravar.')
+
+    def handle(self, *args, **options):
+        importer = GastoImporter(
+            segmento_padrao=self.get_segmento(options['segmento']),
+            apenas_debitos=not options['todos'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        for caminho in options['arquivo']:
+            try:
+                with open(caminho, 'rb') as arquivo:
+                    resultado = importer.importar(arquivo, options['formato'])
+            except (OSError, ValueError) as erro:
+                raise CommandError('{}: {}'.format(caminho, erro))
+            for linha, erro in resultado.erros:
+                self.stderr.write('{}:{}: {}'.format(caminho, linha, erro))
+            self.stdout.write('{}: {}'.format(caminho, resultado))
+
+    def get_segmento(self, valor):
+        if not valor:
+            return None
+        segmentos = Segmento.objects.all()
+        segmento = (
+            (segmentos.filter(pk=valor).first() if valor.isdigit() else None)
+            or segmentos.filter(name__iexact=valor).first()
+            or segmentos.filter(slug=valor).first()
+        )
+        if segmento is None:
+            raise CommandError('Segmento não encontrado: {}'.format(valor))
+        return segmento
@@ -0,0 +1,30 @@
+# coding=utf-8
+from django.core.management.base import BaseCommand, CommandError
+
+from website import summary
+
+
+class Command(BaseCommand):
+    help = 'Recria o resumo mensal de gastos (GastoMonthlySummary) e confere com as linhas de Gasto.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only', action='store_true',
+            help='Apenas confere o resumo atual, sem recriá-lo.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            linhas = summary.rebuild()
+            self.stdout.write('Resumo recriado: {} linhas.'.format(linhas))
+
+        divergencias = summary.verify()
+        for segmento_id, mes, esperado, encontrado in divergencias:
+            self.stderr.write(
+                'Segmento {} {:%m/%Y}: esperado total={} qtd={}, encontrado total={} qtd={}'.format(
+                    segmento_id, mes, esperado[0], esperado[1], encontrado[0], encontrado[1]
+                )
+            )
+        if divergencias:
+            raise CommandError('{} divergência(s) no resumo mensal.'.format(len(divergencias)))
+        self.stdout.write(self.style.SUCCESS('Resumo mensal confere com os gastos.'))
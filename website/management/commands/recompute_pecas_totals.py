@@ -0,0 +1,29 @@
+# coding=utf-8
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from website import manutencao, pecas_total
+from website.models import Itenspecas, Pecas
+
+
+class Command(BaseCommand):
+    help = ('Recalcula o subtotal (preço × quantidade) de todos os itens e o total '
+            'das peças a partir dos itens, com UPDATEs em massa. Rode depois de '
+            'gravações que não disparam sinais (bulk_create, queryset.update, SQL).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true',
+                            help='Zera também o total das peças sem itens (por padrão '
+                                 'elas mantêm o total digitado).')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            itens = pecas_total.recalcular_subtotais()
+            pecas = Pecas.objects.all()
+            if not options['todas']:
+                pecas = pecas.filter(pk__in=Itenspecas.objects.values('pecas'))
+            notas = pecas.update(total=pecas_total.total_expression(), modified_at=timezone.now())
+            manutencao.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            '{} itens e {} peças recalculados.'.format(itens, notas)))
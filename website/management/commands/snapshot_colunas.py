@@ -0,0 +1,36 @@
+# coding=utf-8
+from django.core.management.base import BaseCommand
+
+from website import snapshot
+
+
+class Command(BaseCommand):
+    help = ('Exporta Gasto, Pecas e Rabbiit para arquivos colunares (Parquet com '
+            'pyarrow, senão .npz) particionados por ano/mês, só com as linhas '
+            'alteradas desde a última exportação. Leitura com website.snapshot.ler.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tabela', action='append', choices=list(snapshot.TABELAS),
+                            help='Exporta só esta tabela (pode repetir). Padrão: todas.')
+        parser.add_argument('--diretorio',
+                            help='Diretório da cópia (padrão: settings.SNAPSHOT_DIR).')
+        parser.add_argument('--formato', choices=snapshot.FORMATOS,
+                            help='Formato dos arquivos (padrão: parquet se o pyarrow '
+                                 'estiver instalado, senão npz).')
+        parser.add_argument('--completo', action='store_true',
+                            help='Recria a cópia do zero, sem as linhas excluídas do banco.')
+
+    def handle(self, *args, **options):
+        diretorio = options['diretorio'] or snapshot.diretorio_padrao()
+        exportadas = snapshot.exportar(
+            tabelas=options['tabela'],
+            diretorio=diretorio,
+            formato=options['formato'],
+            completo=options['completo'],
+        )
+        tabelas = snapshot.manifesto(diretorio)['tabelas']
+        for tabela, linhas in exportadas.items():
+            estado = tabelas[tabela]
+            self.stdout.write('{}: {} linhas exportadas (lote {}, marca {}).'.format(
+                tabela, linhas, estado['lote'], estado['marca'] or '-'))
+        self.stdout.write(self.style.SUCCESS('Cópia atualizada em {}.'.format(diretorio)))
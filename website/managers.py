@@ -0,0 +1,22 @@
+# coding=utf-8
+"""
+Manager com a leitura em colunas tipadas (website.columnar) para
+relatórios e análises. NumPy e pandas só são importados quando um desses
+métodos é chamado, não na carga dos models.
+"""
+from django.db import models
+
+
+class ColumnarQuerySet(models.QuerySet):
+
+    def to_columns(self, tipos, chunk_size=None):
+        """``columnar.carregar`` desta consulta: um array NumPy por campo."""
+        from . import columnar
+        return columnar.carregar(self, tipos, chunk_size or columnar.CHUNK_SIZE)
+
+    def to_dataframe(self, tipos, nomes=None, chunk_size=None):
+        """DataFrame montado direto das colunas tipadas de ``to_columns``."""
+        return self.to_columns(tipos, chunk_size).to_dataframe(nomes)
+
+
+ColumnarManager = models.Manager.from_queryset(ColumnarQuerySet)
@@ -0,0 +1,148 @@
+# coding=utf-8
+"""
+Previsão de manutenção dos veículos a partir do histórico de peças.
+
+O histórico (uma linha por item comprado, com a nota, a data e a
+quilometragem da troca) é lido numa consulta só direto em colunas
+tipadas (website.columnar); os intervalos, custos e a próxima troca de
+cada (veículo, peça) saem de operações agrupadas do pandas, sem laço por
+objeto. NumPy e pandas são importados só quando o relatório é calculado,
+para não pesar na carga dos processos web.
+
+O resultado fica no cache dos relatórios (website.report_cache) sob uma
+geração própria, trocada depois do commit a cada gravação de Pecas ou
+Itenspecas (sinais ligados em website.apps). Gravações em massa chamam
+``invalidate``.
+"""
+from . import report_cache
+from .constants import TYPE_VEHICLE
+from .models import Itenspecas
+
+GENERATION_KEY = 'manutencao:generation'
+
+# campo do Itenspecas: (coluna do DataFrame, tipo em website.columnar)
+CAMPOS = {
+    'pecas__veiculo': ('veiculo', 'object'),
+    'description': ('peca', 'object'),
+    'pecas_id': ('nota', 'int64'),
+    'pecas__data': ('data', 'datetime64[D]'),
+    'pecas__troca': ('troca', 'int64'),
+    'pecas__proxtroca': ('proxtroca', 'int64'),
+    'subtotal': ('custo', 'float64'),
+}
+
+VEICULOS = dict(TYPE_VEHICLE)
+
+
+def carregar_historico():
+    """Itens de todas as notas como DataFrame, uma coluna tipada por campo."""
+    historico = Itenspecas.objects.order_by().to_dataframe(
+        {campo: tipo for campo, (_, tipo) in CAMPOS.items()},
+        {campo: coluna for campo, (coluna, _) in CAMPOS.items()},
+    )
+    historico['peca'] = (
+        historico['peca'].str.strip().str.replace(r'\s+', ' ', regex=True).str.capitalize())
+    historico['custo'] = historico['custo'].fillna(0.0)
+    return historico
+
+
+def calcular(historico):
+    """
+    Uma linha por (veículo, peça) com a quantidade de trocas, o intervalo
+    usual em dias e em km (medianas entre trocas seguidas), o custo médio
+    por troca, o custo por km e por dia do intervalo e a previsão da
+    próxima troca.
+    """
+    import numpy as np
+    import pandas as pd
+
+    grupo = ['veiculo', 'peca']
+    if historico.empty:
+        return pd.DataFrame()
+
+    # Uma troca por nota, mesmo que a peça apareça em mais de um item
+    trocas = (
+        historico.groupby(grupo + ['nota'], sort=False)
+        .agg(data=('data', 'first'), troca=('troca', 'first'),
+             proxtroca=('proxtroca', 'first'), custo=('custo', 'sum'))
+        .reset_index()
+        .sort_values(grupo + ['data', 'troca'])
+    )
+    anteriores = trocas.groupby(grupo, sort=False)
+    trocas['dias'] = anteriores['data'].diff().dt.days
+    km = anteriores['troca'].diff()
+    # Hodômetro zerado, trocado ou não informado (padrão 1) não vira intervalo
+    trocas['km'] = km.where((km > 0) & (trocas['troca'] > 1))
+    planejado = trocas['proxtroca'] - trocas['troca']
+    trocas['km_planejado'] = planejado.where(planejado > 0)
+
+    resumo = trocas.groupby(grupo, sort=True).agg(
+        trocas=('nota', 'size'),
+        primeira=('data', 'min'),
+        ultima=('data', 'last'),
+        ultima_troca=('troca', 'last'),
+        ultima_proxtroca=('proxtroca', 'last'),
+        intervalo_dias=('dias', 'median'),
+        intervalo_km=('km', 'median'),
+        km_planejado=('km_planejado', 'median'),
+        custo_medio=('custo', 'mean'),
+        custo_total=('custo', 'sum'),
+    )
+    # Sem duas trocas com hodômetro, usa o intervalo planejado nas notas
+    resumo['intervalo_km'] = resumo['intervalo_km'].fillna(resumo['km_planejado'])
+    resumo['custo_km'] = resumo['custo_medio'] / resumo['intervalo_km']
+    resumo['custo_dia'] = resumo['custo_medio'] / resumo['intervalo_dias'].where(
+        resumo['intervalo_dias'] > 0)
+    resumo['proxima_data'] = resumo['ultima'] + pd.to_timedelta(
+        resumo['intervalo_dias'].round(), unit='D')
+    resumo['proxima_km'] = np.where(
+        resumo['ultima_proxtroca'] > resumo['ultima_troca'],
+        resumo['ultima_proxtroca'],
+        resumo['ultima_troca'] + resumo['intervalo_km'],
+    )
+    return resumo.drop(columns=['km_planejado', 'ultima_proxtroca']).reset_index()
+
+
+def _linhas(resumo):
+    """DataFrame -> dicts com tipos do Python (para o cache e os templates)."""
+    import pandas as pd
+
+    linhas = []
+    for linha in resumo.to_dict('records'):
+        for chave, valor in linha.items():
+            if isinstance(valor, pd.Timestamp):
+                linha[chave] = valor.date()
+            elif valor is pd.NaT or (isinstance(valor, float) and valor != valor):
+                linha[chave] = None
+            elif hasattr(valor, 'item'):
+                linha[chave] = valor.item()
+        linha['veiculo_nome'] = VEICULOS.get(linha['veiculo'], linha['veiculo'])
+        linhas.append(linha)
+    return linhas
+
+
+def previsao():
+    """
+    Linhas do relatório, do cache quando possível, ordenadas pela próxima
+    troca prevista (as sem previsão por último).
+    """
+    def calcular_linhas():
+        linhas = _linhas(calcular(carregar_historico()))
+        linhas.sort(key=lambda l: (l['proxima_data'] is None, l['proxima_data'] or l['ultima']))
+        return linhas
+
+    key = '{}:{}'.format(GENERATION_KEY, report_cache.generation(GENERATION_KEY))
+    return report_cache.get_or_set(key, calcular_linhas)
+
+
+def invalidate():
+    """Troca a geração depois do commit da transação atual."""
+    report_cache.replace_generation(GENERATION_KEY)
+
+
+# SINAIS
+# ----------------------------------------------
+
+def pecas_changed(sender, raw=False, **kwargs):
+    if not raw:
+        invalidate()
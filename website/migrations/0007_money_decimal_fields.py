@@ -0,0 +1,44 @@
+# Colunas numéricas para os valores monetários, preenchidas pela 0008
+# e renomeadas para os nomes originais na 0009.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0006_auto_20200519_0927'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gasto',
+            name='valor_decimal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='VlrTot'),
+        ),
+        migrations.AddField(
+            model_name='gasto',
+            name='valor_da_parcela_decimal',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='VlrPar'),
+        ),
+        migrations.AddField(
+            model_name='horatrabalhada',
+            name='price_decimal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Ganho/hora'),
+        ),
+        migrations.AddField(
+            model_name='pecas',
+            name='total_decimal',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='Total'),
+        ),
+        migrations.AddField(
+            model_name='itenspecas',
+            name='price_decimal',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='Preço'),
+        ),
+        migrations.AddField(
+            model_name='itenspecas',
+            name='subtotal_decimal',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='Sub-Total'),
+        ),
+    ]
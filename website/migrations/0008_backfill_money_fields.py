@@ -0,0 +1,118 @@
+# Converte os valores em texto no padrão brasileiro ('1.234,56') para as
+# colunas numéricas criadas na 0007. Roda em lotes, cada um na sua própria
+# transação, para não travar as tabelas grandes (website_gasto).
+#
+# Texto que não vira número (ou passa de MAX_VALUE) não é trocado pelo
+# default: a migration junta todos os casos e falha no fim, listando
+# model/pk/campo/texto. As colunas de texto só somem na 0009, então basta
+# corrigir esses registros e rodar o migrate de novo.
+
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 2000
+
+# (model, campo texto, campo numérico, valor quando vazio/inválido)
+MONEY_FIELDS = (
+    ('Gasto', 'valor', 'valor_decimal', Decimal('0')),
+    ('Gasto', 'valor_da_parcela', 'valor_da_parcela_decimal', None),
+    ('HoraTrabalhada', 'price', 'price_decimal', Decimal('0')),
+    ('Pecas', 'total', 'total_decimal', None),
+    ('Itenspecas', 'price', 'price_decimal', None),
+    ('Itenspecas', 'subtotal', 'subtotal_decimal', None),
+)
+
+MAX_VALUE = Decimal('9999999999.99')
+
+# '1.234' sem vírgula: separador de milhar, não três casas decimais
+MILHAR = re.compile(r'^-?\d{1,3}\.\d{3}$')
+
+
+def to_decimal(texto, default):
+    # Cópia congelada de utils.parse_decimal_br: a migration não pode
+    # mudar de comportamento se o utilitário mudar. Vazio vira o default;
+    # texto inválido levanta ValueError.
+    if texto is None:
+        return default
+    texto = str(texto).replace('R$', '').replace(' ', '').strip()
+    if not texto:
+        return default
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    elif texto.count('.') > 1 or MILHAR.match(texto):
+        texto = texto.replace('.', '')
+    try:
+        valor = Decimal(texto)
+    except InvalidOperation:
+        valor = None
+    if valor is None or not valor.is_finite() or abs(valor) > MAX_VALUE:
+        raise ValueError(texto)
+    return valor.quantize(Decimal('0.01'))
+
+
+def to_text(valor):
+    if valor is None:
+        return None
+    return '{:.2f}'.format(valor).replace('.', ',')
+
+
+def copy_in_batches(apps, model_name, source, target, convert, falhas=None):
+    Model = apps.get_model('website', model_name)
+    last_pk = 0
+    while True:
+        rows = list(
+            Model.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', source)[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        objs = []
+        for pk, value in rows:
+            try:
+                convertido = convert(value)
+            except ValueError:
+                falhas.append((model_name, pk, source, value))
+                continue
+            obj = Model(pk=pk)
+            setattr(obj, target, convertido)
+            objs.append(obj)
+        if objs:
+            with transaction.atomic():
+                Model.objects.bulk_update(objs, [target], batch_size=500)
+        last_pk = rows[-1][0]
+
+
+def forwards(apps, schema_editor):
+    falhas = []
+    for model_name, source, target, default in MONEY_FIELDS:
+        copy_in_batches(
+            apps, model_name, source, target,
+            lambda value, default=default: to_decimal(value, default),
+            falhas,
+        )
+    if falhas:
+        linhas = '\n'.join(
+            '  {} pk={} {}={!r}'.format(*falha) for falha in falhas)
+        raise RuntimeError(
+            '{} valor(es) monetário(s) inválido(s); corrija e rode o migrate '
+            'de novo (as colunas de texto foram mantidas):\n{}'.format(len(falhas), linhas))
+
+
+def backwards(apps, schema_editor):
+    for model_name, source, target, default in MONEY_FIELDS:
+        copy_in_batches(apps, model_name, target, source, to_text)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('website', '0007_money_decimal_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
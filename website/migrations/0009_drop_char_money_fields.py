@@ -0,0 +1,36 @@
+# Remove as colunas de texto e assume os nomes originais nas numéricas.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0008_backfill_money_fields'),
+    ]
+
+    operations = [
+        # Default apenas para que a volta (re-adicionar a coluna) funcione.
+        migrations.AlterField(
+            model_name='gasto',
+            name='valor',
+            field=models.CharField(default='', max_length=100, verbose_name='VlrTot'),
+        ),
+        migrations.RemoveField(model_name='gasto', name='valor'),
+        migrations.RemoveField(model_name='gasto', name='valor_da_parcela'),
+        migrations.RemoveField(model_name='horatrabalhada', name='price'),
+        migrations.RemoveField(model_name='pecas', name='total'),
+        migrations.RemoveField(model_name='itenspecas', name='price'),
+        migrations.RemoveField(model_name='itenspecas', name='subtotal'),
+        migrations.RenameField(model_name='gasto', old_name='valor_decimal', new_name='valor'),
+        migrations.RenameField(model_name='gasto', old_name='valor_da_parcela_decimal', new_name='valor_da_parcela'),
+        migrations.RenameField(model_name='horatrabalhada', old_name='price_decimal', new_name='price'),
+        migrations.RenameField(model_name='pecas', old_name='total_decimal', new_name='total'),
+        migrations.RenameField(model_name='itenspecas', old_name='price_decimal', new_name='price'),
+        migrations.RenameField(model_name='itenspecas', old_name='subtotal_decimal', new_name='subtotal'),
+        migrations.AlterField(
+            model_name='gasto',
+            name='valor',
+            field=models.DecimalField(decimal_places=2, max_digits=12, verbose_name='VlrTot'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0009_drop_char_money_fields'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gasto',
+            index=models.Index(fields=['segmento', 'datagasto'], name='gasto_segmento_data_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_summary(apps, schema_editor):
+    Gasto = apps.get_model('website', 'Gasto')
+    GastoMonthlySummary = apps.get_model('website', 'GastoMonthlySummary')
+    rows = (
+        Gasto.objects.order_by()
+        .annotate(mes=TruncMonth('datagasto'))
+        .values('segmento_id', 'mes')
+        .annotate(total=Sum('valor'), quantidade=Count('id'))
+    )
+    GastoMonthlySummary.objects.bulk_create(
+        [GastoMonthlySummary(**row) for row in rows],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0010_gasto_segmento_data_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GastoMonthlySummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(verbose_name='Mês')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Total')),
+                ('quantidade', models.IntegerField(default=0, verbose_name='Quantidade')),
+                ('segmento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='website.Segmento')),
+            ],
+            options={
+                'verbose_name': 'Resumo mensal de gastos',
+                'verbose_name_plural': 'Resumos mensais de gastos',
+                'ordering': ['segmento', 'mes'],
+                'unique_together': {('segmento', 'mes')},
+            },
+        ),
+        migrations.RunPython(populate_summary, migrations.RunPython.noop),
+    ]
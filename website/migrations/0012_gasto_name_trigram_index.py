@@ -0,0 +1,34 @@
+# Índice trigram em UPPER(name) para o autocomplete e as buscas por nome
+# (name__icontains/istartswith viram UPPER("name"::text) LIKE UPPER(...)).
+# Só existe no PostgreSQL; nos outros bancos a migration não faz nada.
+
+from django.db import migrations
+
+INDEX_NAME = 'gasto_name_upper_trgm_idx'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS {} ON website_gasto '
+        'USING gin (UPPER("name"::text) gin_trgm_ops)'.format(INDEX_NAME)
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS {}'.format(INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0011_gasto_monthly_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,124 @@
+# Busca textual de Gasto e Segmento por nome, sem acento e com stemming em
+# português.
+#
+# PostgreSQL: coluna search_vector (tsvector) mantida por trigger, com índice
+# GIN, e a configuração pt_unaccent (portuguese + unaccent).
+# SQLite: tabela FTS5 <tabela>_fts com conteúdo externo, mantida por triggers.
+# Os triggers cobrem também bulk_create e queryset.update. No SQLite, as
+# migrations que recriam a tabela (AddField/AlterField) apagam os triggers:
+# website.fts os recria no post_migrate.
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+CONFIG = 'pt_unaccent'
+TABLES = ('website_gasto', 'website_segmento')
+
+
+def create_postgres(schema_editor):
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    schema_editor.execute(
+        "DO $$ BEGIN "
+        "IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{0}') THEN "
+        "CREATE TEXT SEARCH CONFIGURATION {0} (COPY = portuguese); "
+        "ALTER TEXT SEARCH CONFIGURATION {0} "
+        "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem; "
+        "END IF; END $$".format(CONFIG)
+    )
+    for table in TABLES:
+        schema_editor.execute(
+            "CREATE OR REPLACE FUNCTION {0}_search_vector_update() RETURNS trigger AS $$ "
+            "BEGIN NEW.search_vector := to_tsvector('{1}', COALESCE(NEW.name, '')); "
+            "RETURN NEW; END $$ LANGUAGE plpgsql".format(table, CONFIG)
+        )
+        schema_editor.execute(
+            'CREATE TRIGGER {0}_search_vector_trigger '
+            'BEFORE INSERT OR UPDATE OF name ON {0} '
+            'FOR EACH ROW EXECUTE PROCEDURE {0}_search_vector_update()'.format(table)
+        )
+        schema_editor.execute(
+            "UPDATE {0} SET search_vector = to_tsvector('{1}', COALESCE(name, ''))".format(
+                table, CONFIG)
+        )
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS {0}_search_vector_idx '
+            'ON {0} USING gin (search_vector)'.format(table)
+        )
+
+
+def drop_postgres(schema_editor):
+    for table in TABLES:
+        schema_editor.execute('DROP INDEX IF EXISTS {0}_search_vector_idx'.format(table))
+        schema_editor.execute(
+            'DROP TRIGGER IF EXISTS {0}_search_vector_trigger ON {0}'.format(table))
+        schema_editor.execute(
+            'DROP FUNCTION IF EXISTS {0}_search_vector_update()'.format(table))
+    schema_editor.execute('DROP TEXT SEARCH CONFIGURATION IF EXISTS {}'.format(CONFIG))
+
+
+def create_sqlite(schema_editor):
+    for table in TABLES:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS {0}_fts USING fts5("
+            "name, content='{0}', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')".format(table)
+        )
+        schema_editor.execute(
+            'CREATE TRIGGER IF NOT EXISTS {0}_fts_ai AFTER INSERT ON {0} BEGIN '
+            'INSERT INTO {0}_fts(rowid, name) VALUES (new.id, new.name); END'.format(table)
+        )
+        schema_editor.execute(
+            'CREATE TRIGGER IF NOT EXISTS {0}_fts_ad AFTER DELETE ON {0} BEGIN '
+            "INSERT INTO {0}_fts({0}_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+            'END'.format(table)
+        )
+        schema_editor.execute(
+            'CREATE TRIGGER IF NOT EXISTS {0}_fts_au AFTER UPDATE OF name ON {0} BEGIN '
+            "INSERT INTO {0}_fts({0}_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+            'INSERT INTO {0}_fts(rowid, name) VALUES (new.id, new.name); END'.format(table)
+        )
+        schema_editor.execute("INSERT INTO {0}_fts({0}_fts) VALUES ('rebuild')".format(table))
+
+
+def drop_sqlite(schema_editor):
+    for table in TABLES:
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute('DROP TRIGGER IF EXISTS {0}_fts_{1}'.format(table, suffix))
+        schema_editor.execute('DROP TABLE IF EXISTS {0}_fts'.format(table))
+
+
+def create_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        create_postgres(schema_editor)
+    elif vendor == 'sqlite':
+        create_sqlite(schema_editor)
+
+
+def drop_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        drop_postgres(schema_editor)
+    elif vendor == 'sqlite':
+        drop_sqlite(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0012_gasto_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gasto',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='segmento',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search, drop_search),
+    ]
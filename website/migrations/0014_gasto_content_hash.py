@@ -0,0 +1,32 @@
+# Hash de conteúdo dos gastos importados de extrato (ver website/importer.py).
+
+import importlib
+
+from django.db import migrations, models
+
+
+def recreate_fts_triggers(apps, schema_editor):
+    # No SQLite o AddField recria a tabela website_gasto e apaga os triggers
+    # da busca textual criados na 0013
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    search = importlib.import_module('website.migrations.0013_search_vectors')
+    search.create_sqlite(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0013_search_vectors'),
+    ]
+
+    operations = [
+        # Na volta, o RemoveField também recria a tabela
+        migrations.RunPython(migrations.RunPython.noop, recreate_fts_triggers),
+        migrations.AddField(
+            model_name='gasto',
+            name='content_hash',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(recreate_fts_triggers, migrations.RunPython.noop),
+    ]
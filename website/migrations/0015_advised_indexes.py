@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0014_gasto_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pecas',
+            index=models.Index(fields=['-data', '-id'], name='website_pec_data_555c48_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Subtotal dos itens e total das peças passam a ser calculados
+# (ver website/pecas_total.py); recalcula os valores já gravados. Notas
+# sem itens mantêm o total digitado antes.
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def recalcular(apps, schema_editor):
+    Pecas = apps.get_model('website', 'Pecas')
+    Itenspecas = apps.get_model('website', 'Itenspecas')
+    Itenspecas.objects.update(subtotal=F('price') * F('quantity'))
+    campo = models.DecimalField(max_digits=12, decimal_places=2)
+    soma = (
+        Itenspecas.objects.filter(pecas=OuterRef('pk'))
+        .order_by().values('pecas')
+        .annotate(soma=Sum('subtotal')).values('soma')
+    )
+    Pecas.objects.filter(pk__in=Itenspecas.objects.values('pecas')).update(
+        total=Coalesce(Subquery(soma, output_field=campo), Value(0), output_field=campo))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0015_advised_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='itenspecas',
+            name='subtotal',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Sub-Total'),
+        ),
+        migrations.AlterField(
+            model_name='pecas',
+            name='total',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Total'),
+        ),
+        migrations.RunPython(recalcular, migrations.RunPython.noop),
+    ]
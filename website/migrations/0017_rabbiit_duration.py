@@ -0,0 +1,80 @@
+# Tempo trabalhado do Rabbiit passa de TimeField (time_total) para
+# DurationField (duration). O ganho é recalculado com as horas inteiras:
+# o RabbiitForm antigo usava só os minutos de time_total.
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import migrations, models
+
+LOTE = 1000
+
+
+def _duracao(rabbiit):
+    if rabbiit.time_total is not None:
+        t = rabbiit.time_total
+        return timedelta(hours=t.hour, minutes=t.minute, seconds=t.second)
+    if rabbiit.time_start is not None and rabbiit.time_end is not None:
+        inicio = datetime.combine(datetime.min, rabbiit.time_start)
+        fim = datetime.combine(datetime.min, rabbiit.time_end)
+        if fim < inicio:
+            fim += timedelta(days=1)
+        return fim - inicio
+    return None
+
+
+def _lotes(queryset):
+    lote = []
+    for objeto in queryset.iterator():
+        lote.append(objeto)
+        if len(lote) >= LOTE:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def preencher_duracao(apps, schema_editor):
+    Rabbiit = apps.get_model('website', 'Rabbiit')
+    for lote in _lotes(Rabbiit.objects.select_related('rate_hour').order_by('pk')):
+        for rabbiit in lote:
+            rabbiit.duration = _duracao(rabbiit)
+            if rabbiit.duration is not None and rabbiit.rate_hour is not None:
+                horas = Decimal(rabbiit.duration.total_seconds()) / 3600
+                rabbiit.rate_total = (horas * rabbiit.rate_hour.price).quantize(Decimal('0.01'))
+        Rabbiit.objects.bulk_update(lote, ['duration', 'rate_total'])
+
+
+def preencher_time_total(apps, schema_editor):
+    Rabbiit = apps.get_model('website', 'Rabbiit')
+    for lote in _lotes(Rabbiit.objects.filter(duration__isnull=False).order_by('pk')):
+        for rabbiit in lote:
+            segundos = int(rabbiit.duration.total_seconds())
+            if 0 <= segundos < 24 * 60 * 60:
+                rabbiit.time_total = time(segundos // 3600, segundos // 60 % 60, segundos % 60)
+        Rabbiit.objects.bulk_update(lote, ['time_total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0016_pecas_total_derivado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rabbiit',
+            name='duration',
+            field=models.DurationField(blank=True, null=True, verbose_name='Tempo trabalhado'),
+        ),
+        migrations.AlterField(
+            model_name='rabbiit',
+            name='rate_total',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Total Ganho'),
+        ),
+        migrations.RunPython(preencher_duracao, preencher_time_total),
+        migrations.RemoveField(
+            model_name='rabbiit',
+            name='time_total',
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0017_rabbiit_duration'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gasto',
+            index=models.Index(fields=['modified_at'], name='gasto_modified_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pecas',
+            index=models.Index(fields=['modified_at'], name='pecas_modified_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rabbiit',
+            index=models.Index(fields=['modified_at'], name='rabbiit_modified_at_idx'),
+        ),
+    ]
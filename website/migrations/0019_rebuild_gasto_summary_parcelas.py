@@ -0,0 +1,38 @@
+# O resumo mensal passa a somar o valor da parcela (valor_da_parcela, ou
+# valor quando não informada) em vez do total da compra, que se repete em
+# todas as parcelas; recria o resumo e descarta os relatórios em cache.
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+
+
+def recriar_resumo(apps, schema_editor):
+    Gasto = apps.get_model('website', 'Gasto')
+    GastoMonthlySummary = apps.get_model('website', 'GastoMonthlySummary')
+    rows = (
+        Gasto.objects.order_by()
+        .annotate(mes=TruncMonth('datagasto'))
+        .values('segmento_id', 'mes')
+        .annotate(total=Sum(Coalesce('valor_da_parcela', 'valor')), quantidade=Count('id'))
+    )
+    GastoMonthlySummary.objects.all().delete()
+    GastoMonthlySummary.objects.bulk_create(
+        [GastoMonthlySummary(**row) for row in rows],
+        batch_size=1000
+    )
+    # Nova geração global: os relatórios em cache (website.report_cache) ficam inalcançáveis
+    caches[getattr(settings, 'REPORT_CACHE_ALIAS', 'default')].delete('relatorios:generation')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0018_snapshot_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(recriar_resumo, migrations.RunPython.noop),
+    ]
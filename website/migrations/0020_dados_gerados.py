@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0019_rebuild_gasto_summary_parcelas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DadoGerado',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=100, verbose_name='Modelo')),
+                ('inicio', models.BigIntegerField(verbose_name='Primeiro id')),
+                ('fim', models.BigIntegerField(verbose_name='Último id')),
+            ],
+            options={
+                'verbose_name': 'Faixa de dados gerados',
+                'verbose_name_plural': 'Faixas de dados gerados',
+                'ordering': ['modelo', 'inicio'],
+            },
+        ),
+    ]
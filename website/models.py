@@ -1,20 +1,29 @@
 # coding=utf-8
-from django.db import models
+from decimal import Decimal
+
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
 from django.urls import reverse
-from django_pandas.managers import DataFrameManager
 from django.utils.translation import gettext as _
 from accounts.models import Base
 from .constants import TYPE_VEHICLE
+from .managers import ColumnarManager
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from utils import change_comma_by_dot
+from django.utils import formats
+from utils import add_months
 
+# Valores monetários em reais, com centavos
+MONEY_MAX_DIGITS = 12
+MONEY_DECIMAL_PLACES = 2
 
 
 class Segmento(Base):
 
     name = models.CharField('Tipo de comércio', max_length=100)
     slug = models.SlugField('Identificador', max_length=100)
+    # Preenchido por trigger no PostgreSQL (migration 0013), usado na busca
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -30,7 +39,7 @@ class Segmento(Base):
             'website:gastosPorSegmento',
         )
 
-    objects = DataFrameManager()
+    objects = ColumnarManager()
 
 
 class Gasto(Base):
@@ -39,10 +48,19 @@ class Gasto(Base):
     slug = models.SlugField('Identificador', max_length=100)
     parcelas = models.IntegerField('ParTot', default=1)
     nro_da_parcela = models.IntegerField('ParNro', default=1)
-    valor = models.CharField('VlrTot', max_length=100)
-    valor_da_parcela = models.CharField('VlrPar', max_length=100, blank=True, null=True)
+    valor = models.DecimalField('VlrTot', max_digits=MONEY_MAX_DIGITS, decimal_places=MONEY_DECIMAL_PLACES)
+    valor_da_parcela = models.DecimalField(
+        'VlrPar', max_digits=MONEY_MAX_DIGITS, decimal_places=MONEY_DECIMAL_PLACES,
+        blank=True, null=True
+    )
     datagasto = models.DateField()
     segmento = models.ForeignKey(Segmento, on_delete=models.PROTECT)
+    # Preenchido por trigger no PostgreSQL (migration 0013), usado na busca
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Hash de (nome, valor, data, parcela) dos lançamentos importados de
+    # extrato, para não importar o mesmo lançamento duas vezes. Os gastos
+    # digitados no cadastro ficam sem hash.
+    content_hash = models.CharField(max_length=64, unique=True, null=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -54,16 +72,96 @@ class Gasto(Base):
         verbose_name = 'Gasto'
         verbose_name_plural = 'Gastos'
         ordering = ['-id']
+        indexes = [
+            # Relatórios filtram por segmento e período
+            models.Index(fields=['segmento', 'datagasto'], name='gasto_segmento_data_idx'),
+            # Exportação incremental (website.snapshot)
+            models.Index(fields=['modified_at'], name='gasto_modified_at_idx'),
+        ]
+
+    objects = ColumnarManager()
+
+    def build_installments(self):
+        """
+        Monta (sem gravar) as parcelas deste gasto, uma por mês de
+        calendário a partir de datagasto, numeradas de 1 a ``parcelas``.
+        """
+        return [
+            Gasto(
+                name=self.name,
+                slug=self.slug,
+                parcelas=self.parcelas,
+                nro_da_parcela=numero,
+                valor=self.valor,
+                valor_da_parcela=self.valor_da_parcela,
+                datagasto=add_months(self.datagasto, numero - 1),
+                segmento=self.segmento,
+                status=self.status,
+            )
+            for numero in range(1, max(self.parcelas, 1) + 1)
+        ]
+
+    def save(self, *args, **kwargs):
+        # Os sinais de Gasto atualizam o resumo mensal; o atomic garante
+        # que o resumo e a linha sejam gravados na mesma transação.
+        with transaction.atomic():
+            super(Gasto, self).save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super(Gasto, self).delete(*args, **kwargs)
+
+
+class GastoMonthlySummary(models.Model):
+    """
+    Total e quantidade de gastos por segmento e mês, mantidos por
+    website.summary a partir dos sinais de Gasto.
+    """
+    segmento = models.ForeignKey(Segmento, on_delete=models.CASCADE)
+    mes = models.DateField('Mês')
+    total = models.DecimalField(
+        'Total', max_digits=MONEY_MAX_DIGITS + 4,
+        decimal_places=MONEY_DECIMAL_PLACES, default=0
+    )
+    quantidade = models.IntegerField('Quantidade', default=0)
+
+    def __str__(self):
+        return '{} {:%m/%Y}'.format(self.segmento_id, self.mes)
+
+    class Meta:
+        verbose_name = 'Resumo mensal de gastos'
+        verbose_name_plural = 'Resumos mensais de gastos'
+        ordering = ['segmento', 'mes']
+        unique_together = (('segmento', 'mes'),)
+
+
+class DadoGerado(models.Model):
+    """
+    Faixas de ids (inclusivas) criadas por website.seed, para que
+    ``gerar_dados --remover`` apague só esses registros.
+    """
+    modelo = models.CharField('Modelo', max_length=100)
+    inicio = models.BigIntegerField('Primeiro id')
+    fim = models.BigIntegerField('Último id')
+
+    def __str__(self):
+        return '{} {}-{}'.format(self.modelo, self.inicio, self.fim)
 
-    objects = DataFrameManager()
+    class Meta:
+        verbose_name = 'Faixa de dados gerados'
+        verbose_name_plural = 'Faixas de dados gerados'
+        ordering = ['modelo', 'inicio']
 
 
 class HoraTrabalhada(Base):
-    price = models.CharField(verbose_name='Ganho/hora', max_length=100, default=0)
+    price = models.DecimalField(
+        verbose_name='Ganho/hora', max_digits=MONEY_MAX_DIGITS,
+        decimal_places=MONEY_DECIMAL_PLACES, default=0
+    )
     content = models.TextField(null=True)
 
     def __str__(self):
-        return self.price
+        return formats.number_format(self.price, MONEY_DECIMAL_PLACES)
 
     def __repr__(self):
         return str(self.price)
@@ -76,14 +174,18 @@ class HoraTrabalhada(Base):
 class Rabbiit(Base):
 
     description = models.CharField(verbose_name="Descrição", max_length=100)
-    time_total = models.TimeField(verbose_name='Total de horas', blank=True, null=True)
+    duration = models.DurationField(verbose_name='Tempo trabalhado', blank=True, null=True)
     time_start = models.TimeField(verbose_name='Hora Inicial', blank=True, null=True)
     time_end = models.TimeField(verbose_name='Hora Final', blank=True, null=True)
     rate_hour = models.ForeignKey(HoraTrabalhada,
                                 verbose_name='Ganho/hora',
                                 on_delete=models.SET_NULL,
                                 null=True, blank=True)
-    rate_total = models.DecimalField(verbose_name='Total Ganho', max_digits=6, decimal_places=2, blank=True, null=True)
+    # Tempo trabalhado × ganho/hora, calculado no save()
+    rate_total = models.DecimalField(
+        verbose_name='Total Ganho', max_digits=MONEY_MAX_DIGITS,
+        decimal_places=MONEY_DECIMAL_PLACES, blank=True, null=True, editable=False
+    )
 
     def __str__(self):
         return self.description
@@ -91,11 +193,28 @@ class Rabbiit(Base):
     def __repr__(self):
         return str(self.description)
 
+    def calcular_ganho(self):
+        if self.duration is None or self.rate_hour_id is None:
+            return None
+        horas = Decimal(self.duration.total_seconds()) / 3600
+        return (horas * self.rate_hour.price).quantize(Decimal(10) ** -MONEY_DECIMAL_PLACES)
+
+    def save(self, *args, **kwargs):
+        self.rate_total = self.calcular_ganho()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'rate_total' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['rate_total']
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name_plural = 'Rabbiits'
         ordering = ['-id']
+        indexes = [
+            # Exportação incremental (website.snapshot)
+            models.Index(fields=['modified_at'], name='rabbiit_modified_at_idx'),
+        ]
 
-    objects = DataFrameManager()
+    objects = ColumnarManager()
 
 
 class City(Base):
@@ -142,7 +261,11 @@ class Pecas(Base):
     troca = models.IntegerField(verbose_name=_('Troca'), default=1)
     comercio = models.ForeignKey(Comercio, verbose_name=_('Comércio'), on_delete=models.PROTECT)
     city = models.ForeignKey(City, verbose_name=_('Localidade'), on_delete=models.PROTECT)
-    total = models.CharField(verbose_name=_('Total'), blank=True, null=True, max_length=100)
+    # Soma dos subtotais dos itens, mantida por website.pecas_total
+    total = models.DecimalField(
+        verbose_name=_('Total'), max_digits=MONEY_MAX_DIGITS,
+        decimal_places=MONEY_DECIMAL_PLACES, blank=True, null=True, editable=False
+    )
 
     def __str__(self):
         return self.comercio.description
@@ -151,23 +274,57 @@ class Pecas(Base):
         verbose_name = _('Peça')
         verbose_name_plural = _('Peças')
         ordering = ['id']
+        indexes = [
+            # Sugerido pelo comando advise_indexes: listagem por período
+            models.Index(fields=['-data', '-id'], name='website_pec_data_555c48_idx'),
+            # Exportação incremental (website.snapshot)
+            models.Index(fields=['modified_at'], name='pecas_modified_at_idx'),
+        ]
 
-    # objects = DataFrameManager()
+    objects = ColumnarManager()
 
 
 class Itenspecas(models.Model):
 
     description = models.CharField(verbose_name='Descrição', max_length=100)
     pecas = models.ForeignKey(Pecas, verbose_name='Peças', on_delete=models.PROTECT)
-    price = models.CharField(verbose_name='Preço', blank=True, null=True, max_length=100)
+    price = models.DecimalField(
+        verbose_name='Preço', max_digits=MONEY_MAX_DIGITS,
+        decimal_places=MONEY_DECIMAL_PLACES, blank=True, null=True
+    )
     quantity = models.IntegerField(verbose_name='Quantidade Comprada', default=1)
-    subtotal = models.CharField(verbose_name='Sub-Total', blank=True, null=True, max_length=100)
-
+    # Preço × quantidade, calculado no save()
+    subtotal = models.DecimalField(
+        verbose_name='Sub-Total', max_digits=MONEY_MAX_DIGITS,
+        decimal_places=MONEY_DECIMAL_PLACES, blank=True, null=True, editable=False
+    )
 
     def __str__(self):
         return self.description
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Nota carregada do banco, para recalcular a antiga se o item mudar de nota
+        instance._pecas_id_original = instance.__dict__.get('pecas_id')
+        return instance
+
+    def calcular_subtotal(self):
+        if self.price is None or self.quantity is None:
+            return None
+        return (Decimal(self.price) * self.quantity).quantize(
+            Decimal(10) ** -MONEY_DECIMAL_PLACES)
+
+    def save(self, *args, **kwargs):
+        self.subtotal = self.calcular_subtotal()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'subtotal' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['subtotal']
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'Item Peça'
         verbose_name_plural = 'Itens Peças'
         ordering = ['-id']
+
+    objects = ColumnarManager()
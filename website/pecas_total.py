@@ -0,0 +1,99 @@
+# coding=utf-8
+"""
+Manutenção de Pecas.total, a soma dos subtotais dos itens.
+
+O subtotal de cada item é calculado em ``Itenspecas.save`` (preço ×
+quantidade) e o total da nota é recalculado no banco com um único UPDATE
+com subconsulta agregada, sem trazer os itens para o Python. Os sinais de
+Itenspecas cobrem qualquer caminho que grave um item (views, inline do
+admin, shell); dentro de ``adiar()`` os recálculos são juntados e feitos
+uma vez por nota no fim do bloco, o que as views e o admin usam ao gravar
+o formset. Gravações sem sinais (bulk_create, queryset.update/delete)
+chamam ``recalcular`` ou rodam o comando ``recompute_pecas_totals``.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Itenspecas, Pecas, MONEY_DECIMAL_PLACES, MONEY_MAX_DIGITS
+
+_local = threading.local()
+
+
+def total_expression():
+    """Soma dos subtotais dos itens da nota (0 quando não há itens)."""
+    campo = DecimalField(max_digits=MONEY_MAX_DIGITS, decimal_places=MONEY_DECIMAL_PLACES)
+    soma = (
+        Itenspecas.objects.filter(pecas=OuterRef('pk'))
+        .order_by().values('pecas')
+        .annotate(soma=Sum('subtotal')).values('soma')
+    )
+    return Coalesce(Subquery(soma, output_field=campo), Value(0), output_field=campo)
+
+
+def recalcular(pecas_ids=None):
+    """
+    Recalcula o total das notas ``pecas_ids`` (todas, se None) com um
+    único UPDATE, que também avança o modified_at (usado pela exportação
+    incremental de website.snapshot). Retorna o número de notas atualizadas.
+    """
+    queryset = Pecas.objects.all()
+    if pecas_ids is not None:
+        pecas_ids = {pk for pk in pecas_ids if pk is not None}
+        if not pecas_ids:
+            return 0
+        queryset = queryset.filter(pk__in=pecas_ids)
+    return queryset.update(total=total_expression(), modified_at=timezone.now())
+
+
+def recalcular_subtotais(queryset=None):
+    """UPDATE subtotal = price * quantity dos itens (todos, se None)."""
+    if queryset is None:
+        queryset = Itenspecas.objects.all()
+    return queryset.update(subtotal=F('price') * F('quantity'))
+
+
+@contextmanager
+def adiar():
+    """
+    Junta os recálculos pedidos pelos sinais dentro do bloco e faz um
+    UPDATE só, na mesma transação, ao sair. Blocos aninhados usam o de fora.
+    """
+    if getattr(_local, 'pendentes', None) is not None:
+        yield
+        return
+    _local.pendentes = set()
+    try:
+        with transaction.atomic():
+            yield
+            pendentes, _local.pendentes = _local.pendentes, None
+            recalcular(pendentes)
+    finally:
+        _local.pendentes = None
+
+
+def agendar(*pecas_ids):
+    pendentes = getattr(_local, 'pendentes', None)
+    if pendentes is None:
+        recalcular(pecas_ids)
+    else:
+        pendentes.update(pecas_ids)
+
+
+# SINAIS
+# ----------------------------------------------
+
+def item_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Se o item mudou de nota, a antiga também perde o subtotal
+    agendar(instance.pecas_id, getattr(instance, '_pecas_id_original', None))
+    instance._pecas_id_original = instance.pecas_id
+
+
+def item_post_delete(sender, instance, **kwargs):
+    agendar(instance.pecas_id)
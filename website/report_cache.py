@@ -0,0 +1,147 @@
+# coding=utf-8
+"""
+Cache dos resultados dos relatórios de gastos (website.reports).
+
+As chaves são montadas com os parâmetros normalizados do relatório
+(segmento, período, faixa de valor, página) e com duas gerações: uma por
+segmento, trocada quando um gasto do segmento é gravado ou apagado, e uma
+global, trocada quando o resumo mensal é recalculado. Trocar a geração
+torna inalcançáveis só as entradas afetadas; elas expiram sozinhas.
+
+Os sinais de Gasto cobrem o save()/delete() de cada gasto. As gravações
+em massa passam por ``summary.apply_gastos``/``summary.rebuild``, que
+chamam ``invalidate`` e ``invalidate_all``. A troca acontece depois do
+commit, para que nenhum relatório calculado com os dados antigos seja
+gravado sob a geração nova.
+"""
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.paginator import Page, Paginator
+from django.db import transaction
+
+
+GENERATION_KEY = 'relatorios:generation'
+
+
+def _cache():
+    return caches[getattr(settings, 'REPORT_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'REPORT_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def _segmento_key(segmento_id):
+    return '{}:{}'.format(GENERATION_KEY, segmento_id)
+
+
+def generation(key):
+    cache = _cache()
+    gen = cache.get(key)
+    if gen is None:
+        gen = uuid4().hex
+        if not cache.add(key, gen, None):
+            gen = cache.get(key, gen)
+    return gen
+
+
+def cache_key(report, parte, *extra):
+    params = [
+        report.dt_inicial, report.dt_final, report.valor_min, report.valor_max,
+    ] + list(extra)
+    digest = hashlib.md5(repr([str(p) for p in params]).encode()).hexdigest()
+    return 'relatorios:{}:{}:{}:{}:{}:{}'.format(
+        type(report).__name__, parte, report.segmento_id,
+        generation(GENERATION_KEY), generation(_segmento_key(report.segmento_id)), digest
+    )
+
+
+def get_or_set(key, calcular):
+    """Valor de ``key`` no cache dos relatórios; se faltar, ``calcular()``."""
+    resultado = _cache().get(key)
+    if resultado is None:
+        resultado = calcular()
+        _cache().set(key, resultado, _timeout())
+    return resultado
+
+
+def meses(report):
+    """``report.meses()``, do cache quando possível."""
+    return get_or_set(cache_key(report, 'meses'), report.meses)
+
+
+def page(report, number):
+    """
+    ``report.page(number)``, do cache quando possível. Guarda só as linhas
+    da página e o total de linhas; o Page é remontado sem consultar o banco.
+    """
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        number = 1
+    key = cache_key(report, 'page', number, report.paginate_by)
+    dados = _cache().get(key)
+    if dados is None:
+        pagina = report.page(number)
+        dados = {
+            'rows': list(pagina.object_list),
+            'count': pagina.paginator.count,
+            'number': pagina.number,
+        }
+        _cache().set(key, dados, _timeout())
+    paginator = Paginator([], report.paginate_by)
+    paginator.count = dados['count']
+    return Page(dados['rows'], dados['number'], paginator)
+
+
+def warm(report):
+    """Calcula e guarda os meses e a primeira página do relatório."""
+    meses(report)
+    page(report, 1)
+
+
+def invalidate(segmento_ids):
+    """Troca a geração dos segmentos depois do commit da transação atual."""
+    segmento_ids = set(segmento_ids)
+
+    def trocar():
+        _cache().set_many({_segmento_key(pk): uuid4().hex for pk in segmento_ids}, None)
+
+    if segmento_ids:
+        transaction.on_commit(trocar)
+
+
+def replace_generation(key):
+    """Troca a geração ``key`` depois do commit da transação atual."""
+    transaction.on_commit(lambda: _cache().set(key, uuid4().hex, None))
+
+
+def invalidate_all():
+    replace_generation(GENERATION_KEY)
+
+
+# SINAIS
+# ----------------------------------------------
+
+def gasto_pre_save(sender, instance, raw=False, **kwargs):
+    # Se o gasto mudar de segmento, o antigo também precisa ser invalidado.
+    # A linha antiga já foi lida por summary.gasto_pre_save, ligado antes
+    # deste sinal (website.apps): (segmento_id, datagasto, valor, name).
+    old = getattr(instance, '_summary_old', None)
+    instance._report_old_segmento = old[0] if old else None
+
+
+def gasto_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    segmentos = {instance.segmento_id}
+    if getattr(instance, '_report_old_segmento', None) is not None:
+        segmentos.add(instance._report_old_segmento)
+    invalidate(segmentos)
+
+
+def gasto_post_delete(sender, instance, **kwargs):
+    invalidate([instance.segmento_id])
@@ -0,0 +1,227 @@
+# coding=utf-8
+"""
+Relatórios de gastos calculados no banco.
+
+Os filtros (segmento, período e faixa de valor) viram predicados SQL sobre o
+índice (segmento, datagasto) de Gasto, e os totais por mês saem do resumo
+mensal (GastoMonthlySummary) ou de um GROUP BY sobre TruncMonth, então
+nenhum relatório carrega o segmento inteiro para o processo web. Os
+ganhos do Rabbiit também são agregados no banco, a partir da duração e
+do ganho/hora de cada registro.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import Count, FloatField, Func, Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from utils import parse_decimal_br, convert_date, month_start, add_months
+from .models import Gasto, GastoMonthlySummary, Rabbiit, MONEY_DECIMAL_PLACES
+from .summary import valor_mensal
+
+
+class GastoPorMesReport:
+    """
+    Relatório de gastos de um segmento agrupados por mês.
+
+    ``meses()`` devolve uma linha por mês com total (a soma das parcelas,
+    ver ``summary.valor_mensal``) e quantidade, e ``page()`` busca apenas
+    as linhas de detalhe da página pedida.
+    """
+    detail_fields = ('id', 'name', 'datagasto', 'valor', 'parcelas', 'nro_da_parcela')
+    paginate_by = 25
+
+    def __init__(self, segmento_id, dt_inicial=None, dt_final=None,
+                 valor_min=None, valor_max=None):
+        self.segmento_id = segmento_id
+        self.dt_inicial = dt_inicial
+        self.dt_final = dt_final
+        self.valor_min = valor_min
+        self.valor_max = valor_max
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Monta o relatório a partir dos parâmetros do formulário
+        (segmento_id, dtInicial, dtFinal, valor, valorMin, valorMax).
+        Retorna None se nenhum segmento válido foi escolhido.
+        """
+        try:
+            segmento_id = int(params.get('segmento_id', ''))
+        except ValueError:
+            return None
+
+        dt_inicial = convert_date(params.get('dtInicial', ''))
+        dt_final = convert_date(params.get('dtFinal', '')) or date.today()
+
+        valor_min = _parse_valor(params.get('valorMin', ''))
+        valor_max = _parse_valor(params.get('valorMax', ''))
+        valor = _parse_valor(params.get('valor', ''))
+        if valor is not None:
+            valor_min = valor_max = valor
+
+        return cls(segmento_id, dt_inicial, dt_final, valor_min, valor_max)
+
+    def get_queryset(self):
+        qs = Gasto.objects.filter(segmento_id=self.segmento_id)
+        if self.dt_inicial:
+            qs = qs.filter(datagasto__gte=self.dt_inicial)
+        if self.dt_final:
+            qs = qs.filter(datagasto__lte=self.dt_final)
+        if self.valor_min is not None:
+            qs = qs.filter(valor__gte=self.valor_min)
+        if self.valor_max is not None:
+            qs = qs.filter(valor__lte=self.valor_max)
+        return qs
+
+    def meses(self):
+        """
+        Totais por mês. Sem filtro de valor, os meses inteiros dentro do
+        período vêm de GastoMonthlySummary e só os meses das pontas
+        (parcialmente cobertos) são agregados a partir das linhas.
+        """
+        if self.valor_min is not None or self.valor_max is not None:
+            return self._agregar(self.get_queryset())
+
+        # Meses inteiros: [primeiro_mes, fim_meses)
+        primeiro_mes = self.dt_inicial
+        if primeiro_mes and primeiro_mes.day != 1:
+            primeiro_mes = add_months(month_start(primeiro_mes), 1)
+        fim_meses = None
+        if self.dt_final:
+            fim_meses = month_start(self.dt_final)
+            if add_months(fim_meses, 1) - timedelta(days=1) == self.dt_final:
+                fim_meses = add_months(fim_meses, 1)
+
+        resumo = GastoMonthlySummary.objects.filter(segmento_id=self.segmento_id)
+        pontas = Q()
+        if primeiro_mes:
+            resumo = resumo.filter(mes__gte=primeiro_mes)
+            if primeiro_mes != self.dt_inicial:
+                pontas |= Q(datagasto__lt=primeiro_mes)
+        if fim_meses:
+            resumo = resumo.filter(mes__lt=fim_meses)
+            if fim_meses <= self.dt_final:
+                pontas |= Q(datagasto__gte=fim_meses)
+
+        meses = {
+            row['mes']: row
+            for row in resumo.filter(quantidade__gt=0).values('mes', 'total', 'quantidade')
+        }
+        if pontas:
+            for row in self._agregar(self.get_queryset().filter(pontas)):
+                if row['mes'] in meses:
+                    meses[row['mes']]['total'] += row['total']
+                    meses[row['mes']]['quantidade'] += row['quantidade']
+                else:
+                    meses[row['mes']] = row
+        return [meses[mes] for mes in sorted(meses)]
+
+    def _agregar(self, queryset):
+        return list(
+            queryset
+            .order_by()
+            .annotate(mes=TruncMonth('datagasto'))
+            .values('mes')
+            .annotate(total=Sum(valor_mensal()), quantidade=Count('id'))
+            .order_by('mes')
+        )
+
+    def page(self, number):
+        rows = self.get_queryset().order_by('-datagasto', '-id').values(*self.detail_fields)
+        paginator = Paginator(rows, self.paginate_by)
+        try:
+            return paginator.page(number)
+        except PageNotAnInteger:
+            return paginator.page(1)
+        except EmptyPage:
+            return paginator.page(paginator.num_pages)
+
+
+class Horas(Func):
+    """Um DurationField em horas. Sem intervalo nativo, a duração é gravada em microssegundos."""
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        if connection.features.has_native_duration_field:
+            template = 'EXTRACT(EPOCH FROM %(expressions)s) / 3600.0'
+        else:
+            template = '%(expressions)s / 3600000000.0'
+        return super().as_sql(compiler, connection, template=template, **extra_context)
+
+
+class GanhosReport:
+    """
+    Ganhos do Rabbiit por período (dia, semana ou mês) e por ganho/hora:
+    uma linha por (período, HoraTrabalhada) com o tempo, as horas e o
+    ganho somados no banco. O ganho é a soma do ``rate_total`` gravado
+    (já arredondado a centavos por Rabbiit.save), o mesmo da coluna
+    "Total Ganho", sem passar dinheiro por ponto flutuante.
+    """
+    periodos = {'dia': TruncDay, 'semana': TruncWeek, 'mes': TruncMonth}
+
+    def __init__(self, periodo, dt_inicial=None, dt_final=None, rate_hour_id=None):
+        if periodo not in self.periodos:
+            raise ValueError('Período inválido: {}'.format(periodo))
+        self.periodo = periodo
+        self.dt_inicial = dt_inicial
+        self.dt_final = dt_final
+        self.rate_hour_id = rate_hour_id
+
+    @classmethod
+    def from_params(cls, periodo, params):
+        """Parâmetros: dtInicial, dtFinal e rate_hour (id do HoraTrabalhada)."""
+        try:
+            rate_hour_id = int(params.get('rate_hour', ''))
+        except ValueError:
+            rate_hour_id = None
+        return cls(periodo, convert_date(params.get('dtInicial', '')),
+                   convert_date(params.get('dtFinal', '')), rate_hour_id)
+
+    def get_queryset(self):
+        qs = Rabbiit.objects.filter(duration__isnull=False, rate_hour__isnull=False)
+        if self.dt_inicial:
+            qs = qs.filter(created_at__date__gte=self.dt_inicial)
+        if self.dt_final:
+            qs = qs.filter(created_at__date__lte=self.dt_final)
+        if self.rate_hour_id is not None:
+            qs = qs.filter(rate_hour_id=self.rate_hour_id)
+        return qs
+
+    def linhas(self):
+        trunc = self.periodos[self.periodo]
+        horas = Horas('duration')
+        rows = (
+            self.get_queryset()
+            .order_by()
+            .annotate(inicio=trunc('created_at'))
+            .values('inicio', 'rate_hour_id', 'rate_hour__price')
+            .annotate(
+                duracao=Sum('duration'),
+                horas=Sum(horas),
+                ganho=Sum('rate_total'),
+                registros=Count('id'),
+            )
+            .order_by('inicio', 'rate_hour__price')
+        )
+        centavos = Decimal(10) ** -MONEY_DECIMAL_PLACES
+        return [{
+            'inicio': row['inicio'].date(),
+            'rate_hour': row['rate_hour_id'],
+            'ganho_hora': row['rate_hour__price'],
+            'duracao': row['duracao'],
+            'horas': round(row['horas'], 4),
+            # O SQLite soma decimais como REAL: volta para centavos exatos
+            'ganho': (row['ganho'] or Decimal('0')).quantize(centavos),
+            'registros': row['registros'],
+        } for row in rows]
+
+
+def _parse_valor(valor):
+    if not valor:
+        return None
+    try:
+        return parse_decimal_br(valor)
+    except ValueError:
+        return None
@@ -0,0 +1,318 @@
+# coding=utf-8
+"""
+Gerador de dados sintéticos para medir desempenho (comando ``gerar_dados``).
+
+Os volumes são configuráveis e a semente do ``random`` é fixa, então a mesma
+chamada gera sempre os mesmos dados. Os ids de tudo que é criado ficam
+registrados em faixas (DadoGerado), e ``remover_dados`` apaga só esses
+registros: um gasto cadastrado à mão num segmento gerado, por exemplo,
+continua lá (e o segmento também). O prefixo ``PREFIXO`` nos nomes só
+serve para reconhecer os dados na tela. As gravações usam bulk_create em
+lotes e, como os sinais não disparam, o resumo mensal dos segmentos
+gerados é recalculado no fim (um GROUP BY) e o autocomplete é invalidado.
+"""
+import random
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from vendor.cruds_adminlte import cache as crud_cache
+from . import autocomplete, manutencao, pecas_total, summary
+from .constants import TYPE_VEHICLE
+from .models import (
+    Segmento, Gasto, Rabbiit, HoraTrabalhada, City,
+    Comercio, Pecas, Itenspecas, DadoGerado
+)
+
+PREFIXO = 'seed'
+
+SEGMENTOS = {
+    'Supermercados': ['Pão de Açúcar', 'Carrefour', 'Extra', 'Assaí', 'Dia', 'Mercado São José'],
+    'Restaurantes': ['Outback', 'Madero', 'Coco Bambu', 'Restaurante Sabor Caseiro', 'iFood'],
+    'Combustível': ['Posto Ipiranga', 'Posto Shell', 'Posto BR', 'Posto Ale'],
+    'Farmácia': ['Drogasil', 'Droga Raia', 'Pague Menos', 'Drogaria São Paulo'],
+    'Vestuário': ['Renner', 'C&A', 'Riachuelo', 'Centauro', 'Zara'],
+    'Eletrônicos': ['Magazine Luiza', 'Casas Bahia', 'Fast Shop', 'Americanas'],
+    'Serviços': ['Netflix', 'Spotify', 'Claro', 'Vivo', 'Sabesp', 'Enel'],
+    'Transporte': ['Uber', '99', 'Metrô', 'Estacionamento Centro'],
+}
+PECAS = ['Óleo do motor', 'Filtro de óleo', 'Filtro de ar', 'Pastilha de freio',
+         'Vela de ignição', 'Correia dentada', 'Pneu', 'Bateria', 'Lâmpada farol',
+         'Fluido de freio', 'Corrente', 'Kit relação', 'Amortecedor']
+CIDADES = ['São Paulo', 'Campinas', 'Santos', 'Sorocaba', 'Jundiaí', 'Ribeirão Preto']
+MODELOS = (Segmento, Gasto, Rabbiit, HoraTrabalhada, City, Comercio, Pecas, Itenspecas)
+ATIVIDADES = ['Reunião', 'Desenvolvimento', 'Revisão de código', 'Suporte', 'Documentação']
+
+
+def _dinheiro(gerador, minimo, maximo):
+    return Decimal(gerador.randint(int(minimo * 100), int(maximo * 100))) / 100
+
+
+class GeradorDados:
+    """
+    Gera Segmento/Gasto (com parcelas), Comercio/City/Pecas/Itenspecas e
+    HoraTrabalhada/Rabbiit. ``gastos``, ``pecas`` e ``rabbiits`` são a
+    quantidade de registros "de origem": cada gasto parcelado vira uma
+    linha por parcela.
+    """
+
+    def __init__(self, gastos=10000, pecas=1000, itens_por_peca=5, rabbiits=2000,
+                 anos=3, semente=42, batch_size=1000, hoje=None):
+        self.gastos = gastos
+        self.pecas = pecas
+        self.itens_por_peca = itens_por_peca
+        self.rabbiits = rabbiits
+        self.anos = anos
+        self.batch_size = batch_size
+        self.random = random.Random(semente)
+        self.hoje = hoje or date.today()
+        self.inicio = self.hoje - timedelta(days=365 * anos)
+        self.criados = {}
+        self.faixas = {}
+
+    def data(self):
+        return self.inicio + timedelta(days=self.random.randint(0, (self.hoje - self.inicio).days))
+
+    def _contar(self, model, quantidade):
+        nome = model._meta.model_name
+        self.criados[nome] = self.criados.get(nome, 0) + quantidade
+
+    def _registrar(self, model, objetos):
+        """Conta os objetos criados e junta os ids às faixas do model."""
+        faixas = self.faixas.setdefault(model._meta.label, [])
+        for pk in sorted(objeto.pk for objeto in objetos):
+            if faixas and faixas[-1][1] + 1 == pk:
+                faixas[-1][1] = pk
+            else:
+                faixas.append([pk, pk])
+        self._contar(model, len(objetos))
+
+    def _criar(self, model, objetos):
+        """bulk_create que preenche os ids e registra os objetos."""
+        if not objetos:
+            return
+        sem_ids = not connection.features.can_return_ids_from_bulk_insert
+        if sem_ids:
+            ultimo = model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        model.objects.bulk_create(objetos)
+        if sem_ids:
+            # Sem RETURNING (SQLite): os ids são os criados depois do último;
+            # a transação de gerar() segura a escrita até o fim
+            ids = model.objects.filter(pk__gt=ultimo).order_by('pk').values_list('pk', flat=True)
+            for objeto, pk in zip(objetos, ids):
+                objeto.pk = pk
+        self._registrar(model, objetos)
+
+    def gerar(self):
+        with transaction.atomic():
+            segmentos = self.gerar_segmentos()
+            self.gerar_gastos(segmentos)
+            summary.rebuild([segmento.pk for segmento in segmentos])
+            self.gerar_pecas()
+            self.gerar_rabbiits()
+            DadoGerado.objects.bulk_create([
+                DadoGerado(modelo=modelo, inicio=inicio, fim=fim)
+                for modelo, faixas in self.faixas.items()
+                for inicio, fim in faixas
+            ])
+            crud_cache.touch(*MODELOS)
+            manutencao.invalidate()
+        autocomplete.name_index.invalidate()
+        return self.criados
+
+    # GASTOS
+    # ----------------------------------------------
+
+    def gerar_segmentos(self):
+        segmentos = []
+        for nome in SEGMENTOS:
+            slug = '{}-{}'.format(PREFIXO, slugify(nome))
+            segmento, criado = Segmento.objects.get_or_create(slug=slug, defaults={'name': nome})
+            if criado:
+                self._registrar(Segmento, [segmento])
+            segmentos.append(segmento)
+        return segmentos
+
+    def gerar_gastos(self, segmentos):
+        lote = []
+        for _ in range(self.gastos):
+            segmento = self.random.choice(segmentos)
+            nome = self.random.choice(SEGMENTOS[segmento.name])
+            # ~1 em 5 compras é parcelada, de 2 a 12 vezes
+            parcelas = self.random.choice((2, 3, 4, 6, 10, 12)) if self.random.random() < 0.2 else 1
+            valor_parcela = _dinheiro(self.random, 5, 800)
+            gasto = Gasto(
+                name=nome,
+                slug='{}-{}'.format(PREFIXO, slugify(nome)),
+                parcelas=parcelas,
+                valor=valor_parcela * parcelas,
+                valor_da_parcela=valor_parcela,
+                datagasto=self.data(),
+                segmento=segmento,
+            )
+            lote.extend(gasto.build_installments())
+            if len(lote) >= self.batch_size:
+                self._gravar_gastos(lote)
+                lote = []
+        self._gravar_gastos(lote)
+
+    def _gravar_gastos(self, gastos):
+        self._criar(Gasto, gastos)
+
+    # PEÇAS
+    # ----------------------------------------------
+
+    def gerar_pecas(self):
+        if not self.pecas:
+            return
+        comercios = []
+        for nome in ('Auto Peças Central', 'Moto Peças Silva', 'Oficina do Zé', 'Retífica Paulista'):
+            descricao = '{} {}'.format(PREFIXO, nome)
+            comercio, criado = Comercio.objects.get_or_create(description=descricao)
+            if criado:
+                self._registrar(Comercio, [comercio])
+            comercios.append(comercio)
+        cidades = []
+        for nome in CIDADES:
+            cidade = City.objects.filter(description='{} {}'.format(PREFIXO, nome)).first()
+            if cidade is None:
+                cidade = City.objects.create(description='{} {}'.format(PREFIXO, nome))
+                self._registrar(City, [cidade])
+            cidades.append(cidade)
+
+        restantes = self.pecas
+        while restantes:
+            quantidade = min(restantes, self.batch_size)
+            restantes -= quantidade
+            self._gravar_pecas(quantidade, comercios, cidades)
+
+    def _gravar_pecas(self, quantidade, comercios, cidades):
+        pecas = []
+        itens = []
+        for _ in range(quantidade):
+            troca = self.random.randint(1000, 90000)
+            peca = Pecas(
+                data=self.data(),
+                veiculo=self.random.choice(TYPE_VEHICLE)[0],
+                troca=troca,
+                proxtroca=troca + self.random.choice((1000, 3000, 5000, 10000)),
+                comercio=self.random.choice(comercios),
+                city=self.random.choice(cidades),
+                total=Decimal('0'),
+            )
+            pecas.append(peca)
+            itens.append([
+                Itenspecas(
+                    description=self.random.choice(PECAS),
+                    price=_dinheiro(self.random, 10, 600),
+                    quantity=self.random.randint(1, 4),
+                )
+                for _ in range(self.random.randint(1, self.itens_por_peca * 2 - 1))
+            ])
+            for item in itens[-1]:
+                item.subtotal = item.price * item.quantity
+                peca.total += item.subtotal
+
+        self._criar(Pecas, pecas)
+        todos = []
+        for peca, itens_peca in zip(pecas, itens):
+            for item in itens_peca:
+                item.pecas = peca
+            todos.extend(itens_peca)
+        self._criar(Itenspecas, todos)
+
+    # HORAS TRABALHADAS
+    # ----------------------------------------------
+
+    def gerar_rabbiits(self):
+        if not self.rabbiits:
+            return
+        taxas = list(HoraTrabalhada.objects.filter(gerados(HoraTrabalhada)).order_by('price'))
+        if not taxas:
+            taxas = [
+                HoraTrabalhada(price=Decimal(price), content=PREFIXO)
+                for price in ('45.00', '80.00', '120.00', '150.00')
+            ]
+            self._criar(HoraTrabalhada, taxas)
+
+        rabbiits = []
+        for _ in range(self.rabbiits):
+            taxa = self.random.choice(taxas)
+            inicio = self.random.randint(8 * 60, 17 * 60)
+            minutos = self.random.randint(5, min(180, 23 * 60 + 59 - inicio))
+            fim = inicio + minutos
+            rabbiits.append(Rabbiit(
+                description='{} {}'.format(PREFIXO, self.random.choice(ATIVIDADES)),
+                time_start=time(inicio // 60, inicio % 60),
+                time_end=time(fim // 60, fim % 60),
+                duration=timedelta(minutes=minutos),
+                rate_hour=taxa,
+                rate_total=(taxa.price * minutos / 60).quantize(Decimal('0.01')),
+            ))
+            if len(rabbiits) >= self.batch_size:
+                self._gravar_rabbiits(rabbiits)
+                rabbiits = []
+        self._gravar_rabbiits(rabbiits)
+
+    def _gravar_rabbiits(self, rabbiits):
+        self._criar(Rabbiit, rabbiits)
+
+
+def _faixas(model):
+    return list(DadoGerado.objects.filter(modelo=model._meta.label).values_list('inicio', 'fim'))
+
+
+def gerados(model):
+    """Q com os ids de ``model`` registrados pelo gerador."""
+    condicao = Q(pk__in=[])
+    for inicio, fim in _faixas(model):
+        condicao |= Q(pk__range=(inicio, fim))
+    return condicao
+
+
+def remover_dados():
+    """
+    Apaga o que ``GeradorDados`` registrou. Segmentos, comércios, cidades,
+    notas de peças e taxas que ganharam registros de fora do gerador ficam
+    (e deixam de ser tratados como gerados).
+    """
+    removidos = {}
+    # adiar(): um recálculo de Pecas.total no fim, não um por item apagado
+    with transaction.atomic(), pecas_total.adiar():
+        # queryset.delete() carregaria os gastos e mandaria os sinais do
+        # resumo um a um: um DELETE direto por faixa e o resumo recriado depois.
+        segmento_ids = list(
+            Gasto.objects.filter(gerados(Gasto)).order_by()
+            .values_list('segmento_id', flat=True).distinct()
+        )
+        removidos['gasto'] = 0
+        with connection.cursor() as cursor:
+            for inicio, fim in _faixas(Gasto):
+                cursor.execute(
+                    'DELETE FROM {} WHERE {} BETWEEN %s AND %s'.format(
+                        connection.ops.quote_name(Gasto._meta.db_table),
+                        connection.ops.quote_name(Gasto._meta.pk.column)),
+                    [inicio, fim])
+                removidos['gasto'] += cursor.rowcount
+        if segmento_ids:
+            summary.rebuild(segmento_ids)
+        # Na ordem das FKs (PROTECT): os pais só saem se ficaram sem filhos
+        for nome, queryset in (
+            ('itenspecas', Itenspecas.objects.filter(gerados(Itenspecas))),
+            ('pecas', Pecas.objects.filter(gerados(Pecas), itenspecas__isnull=True)),
+            ('comercio', Comercio.objects.filter(gerados(Comercio), pecas__isnull=True)),
+            ('city', City.objects.filter(gerados(City), pecas__isnull=True)),
+            ('segmento', Segmento.objects.filter(gerados(Segmento), gasto__isnull=True)),
+            ('rabbiit', Rabbiit.objects.filter(gerados(Rabbiit))),
+            ('horatrabalhada', HoraTrabalhada.objects.filter(
+                gerados(HoraTrabalhada), rabbiit__isnull=True)),
+        ):
+            removidos[nome] = queryset.delete()[1].get(queryset.model._meta.label, 0)
+        DadoGerado.objects.all().delete()
+        crud_cache.touch(*MODELOS)
+        manutencao.invalidate()
+    autocomplete.name_index.invalidate()
+    return removidos
@@ -0,0 +1,288 @@
+# coding=utf-8
+"""
+Cópia em arquivos colunares de Gasto, Pecas e Rabbiit, para análises
+pesadas sem consultar o banco de produção.
+
+``exportar`` (comando ``snapshot_colunas``) lê em colunas tipadas
+(``to_columns`` do ColumnarManager, website.columnar) só as linhas com
+``modified_at`` depois da marca d'água da última exportação e grava um
+arquivo por mês da data de cada linha, em
+``<diretório>/<tabela>/ano=AAAA/mes=MM/lote-NNNNN.<ext>``: Parquet quando
+o pyarrow está instalado, senão ``.npz`` comprimido do NumPy. O
+``manifest.json`` na raiz lista os arquivos de cada tabela e guarda a
+marca d'água; ele é trocado de uma vez, depois que os arquivos do lote
+estão gravados, então uma exportação interrompida não aparece para quem
+lê.
+
+A marca d'água é o início da exportação menos SNAPSHOT_LAG segundos, não
+o maior ``modified_at`` lido: uma transação que commita depois da leitura
+pode ter gravado ``modified_at`` anterior a ela, e a folga faz o lote
+seguinte ler essas linhas de novo. Linhas repetidas entre lotes, ou
+alteradas, não são problema: ``ler`` fica com a versão do lote mais novo
+de cada id. Exclusões não mudam o ``modified_at``: para
+tirá-las da cópia, exporte com ``completo=True`` (``--completo``), que
+recria a tabela do zero. Gravações que não passam pelo ``save``
+(queryset.update, SQL) precisam atualizar o ``modified_at`` para entrar
+no próximo lote, como faz website.pecas_total.
+
+Nos arquivos, valores monetários ficam em centavos (int64), datas/horas
+em UTC, FKs nulas como 0 e, no ``.npz``, textos nulos como ''. ``ler`` e
+``manifesto`` só precisam do diretório, não do banco.
+"""
+import importlib.util
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from django.conf import settings
+from django.utils.timezone import now
+
+from . import columnar
+
+MANIFESTO = 'manifest.json'
+FORMATOS = ('parquet', 'npz')
+
+_BASE = {
+    'status': 'bool',
+    'created_at': 'datetime64[us]',
+    'modified_at': 'datetime64[us]',
+}
+
+# tabela: (model, campo que define a partição, {campo: tipo em website.columnar})
+TABELAS = {
+    'gasto': ('website.Gasto', 'datagasto', dict({
+        'id': 'int64',
+        'name': 'object',
+        'datagasto': 'datetime64[D]',
+        'valor': columnar.CENTAVOS,
+        'valor_da_parcela': columnar.CENTAVOS,
+        'parcelas': 'int64',
+        'nro_da_parcela': 'int64',
+        'segmento_id': 'int64',
+    }, **_BASE)),
+    'pecas': ('website.Pecas', 'data', dict({
+        'id': 'int64',
+        'data': 'datetime64[D]',
+        'veiculo': 'object',
+        'troca': 'int64',
+        'proxtroca': 'int64',
+        'comercio_id': 'int64',
+        'city_id': 'int64',
+        'total': columnar.CENTAVOS,
+    }, **_BASE)),
+    'rabbiit': ('website.Rabbiit', 'created_at', dict({
+        'id': 'int64',
+        'description': 'object',
+        'duration': 'timedelta64[us]',
+        'rate_hour_id': 'int64',
+        'rate_total': columnar.CENTAVOS,
+    }, **_BASE)),
+}
+
+
+def diretorio_padrao():
+    return getattr(settings, 'SNAPSHOT_DIR', 'snapshots')
+
+
+def folga():
+    """Segundos que cada lote relê antes do início da exportação anterior."""
+    return getattr(settings, 'SNAPSHOT_LAG', 60 * 60)
+
+
+def formato_padrao():
+    return 'parquet' if importlib.util.find_spec('pyarrow') else 'npz'
+
+
+def manifesto(diretorio=None):
+    """Conteúdo do manifest.json (vazio se ainda não houve exportação)."""
+    caminho = os.path.join(diretorio or diretorio_padrao(), MANIFESTO)
+    try:
+        with open(caminho) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'tabelas': {}}
+
+
+def _gravar_manifesto(diretorio, dados):
+    caminho = os.path.join(diretorio, MANIFESTO)
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w') as f:
+        json.dump(dados, f, indent=2)
+    os.replace(temporario, caminho)
+
+
+# EXPORTAÇÃO
+# ----------------------------------------------
+
+def _marca(texto):
+    """Marca d'água do manifesto (UTC) -> datetime para o filtro."""
+    marca = datetime.fromisoformat(texto)
+    return marca.replace(tzinfo=timezone.utc) if settings.USE_TZ else marca
+
+
+def _nova_marca():
+    """Agora menos a folga, no mesmo relógio do auto_now do modified_at."""
+    marca = now() - timedelta(seconds=folga())
+    return marca.replace(tzinfo=None).isoformat(timespec='microseconds')
+
+
+def _particoes(datas):
+    """(ano, mês, seleção) de cada mês presente em ``datas``; NaT vira (None, None)."""
+    meses = datas.astype('datetime64[M]')
+    nulos = np.isnat(meses)
+    for mes in np.unique(meses[~nulos]):
+        numero = int(mes.astype('int64'))
+        yield 1970 + numero // 12, numero % 12 + 1, meses == mes
+    if nulos.any():
+        yield None, None, nulos
+
+
+def _gravar(caminho, arrays, formato):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    if formato == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pq.write_table(pa.table(arrays), caminho)
+        return
+    # Arrays de objetos no .npz exigiriam pickle na leitura
+    arrays = {
+        campo: np.array(['' if valor is None else valor for valor in array], dtype=str)
+        if array.dtype == object else array
+        for campo, array in arrays.items()
+    }
+    np.savez_compressed(caminho, **arrays)
+
+
+def _exportar_tabela(tabela, diretorio, formato, estado):
+    from django.apps import apps
+
+    model, particao, tipos = TABELAS[tabela]
+    queryset = apps.get_model(model)._default_manager.order_by()
+    if estado['marca']:
+        queryset = queryset.filter(modified_at__gt=_marca(estado['marca']))
+    # Antes da leitura: o que commitar depois dela fica depois da marca
+    marca = _nova_marca()
+    colunas = queryset.to_columns(tipos)
+    estado['marca'] = marca
+    estado['exportado_em'] = datetime.now(timezone.utc).isoformat()
+    if not len(colunas):
+        return 0
+
+    lote = estado['lote'] + 1
+    for ano, mes, selecao in _particoes(colunas[particao]):
+        pasta = 'sem_data' if ano is None else os.path.join(
+            'ano={:04d}'.format(ano), 'mes={:02d}'.format(mes))
+        relativo = os.path.join(tabela, pasta, 'lote-{:05d}.{}'.format(lote, formato))
+        _gravar(os.path.join(diretorio, relativo),
+                {campo: colunas[campo][selecao] for campo in colunas}, formato)
+        estado['arquivos'].append({
+            'caminho': relativo,
+            'lote': lote,
+            'ano': ano,
+            'mes': mes,
+            'linhas': int(selecao.sum()),
+        })
+
+    estado['lote'] = lote
+    estado['linhas'] += len(colunas)
+    return len(colunas)
+
+
+def exportar(tabelas=None, diretorio=None, formato=None, completo=False):
+    """
+    Grava o delta de cada tabela desde a última exportação e atualiza o
+    manifesto. Com ``completo``, recria as tabelas do zero (os arquivos
+    antigos só são apagados depois do novo manifesto). Devolve
+    {tabela: linhas exportadas}.
+    """
+    diretorio = diretorio or diretorio_padrao()
+    formato = formato or formato_padrao()
+    os.makedirs(diretorio, exist_ok=True)
+    dados = manifesto(diretorio)
+
+    exportadas = {}
+    for tabela in tabelas or TABELAS:
+        anterior = dados['tabelas'].get(tabela)
+        estado = anterior or {'marca': None, 'lote': 0, 'linhas': 0, 'arquivos': []}
+        if anterior and completo:
+            estado = {'marca': None, 'lote': anterior['lote'], 'linhas': 0, 'arquivos': []}
+        estado['formato'] = formato
+        estado['campos'] = list(TABELAS[tabela][2])
+        exportadas[tabela] = _exportar_tabela(tabela, diretorio, formato, estado)
+        dados['tabelas'][tabela] = estado
+        _gravar_manifesto(diretorio, dados)
+
+        if anterior and completo:
+            for arquivo in anterior['arquivos']:
+                caminho = os.path.join(diretorio, arquivo['caminho'])
+                if os.path.exists(caminho):
+                    os.remove(caminho)
+                    try:
+                        os.removedirs(os.path.dirname(caminho))
+                    except OSError:
+                        pass
+    return exportadas
+
+
+# LEITURA
+# ----------------------------------------------
+
+def _ler_arquivo(caminho, campos=None):
+    import pandas as pd
+
+    if caminho.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        return pq.read_table(caminho, columns=campos).to_pandas(date_as_object=False)
+    with np.load(caminho) as arquivo:
+        return pd.DataFrame({campo: arquivo[campo] for campo in campos or arquivo.files})
+
+
+def ler(tabela, diretorio=None, desde=None, ate=None, campos=None):
+    """
+    DataFrame da tabela com a versão mais recente de cada id. ``desde`` e
+    ``ate`` ('AAAA-MM', inclusivos) limitam os meses lidos; ``campos``
+    escolhe as colunas (o id vem sempre).
+    """
+    import pandas as pd
+
+    diretorio = diretorio or diretorio_padrao()
+    estado = manifesto(diretorio)['tabelas'].get(tabela)
+    if estado is None:
+        raise KeyError('Tabela sem exportação em {}: {}'.format(diretorio, tabela))
+    if campos is not None:
+        campos = ['id'] + [campo for campo in campos if campo != 'id']
+
+    def no_periodo(arquivo):
+        if desde is None and ate is None:
+            return True
+        if arquivo['ano'] is None:
+            return False
+        mes = '{:04d}-{:02d}'.format(arquivo['ano'], arquivo['mes'])
+        return (desde is None or mes >= desde) and (ate is None or mes <= ate)
+
+    frames, fora = [], []
+    for arquivo in estado['arquivos']:
+        caminho = os.path.join(diretorio, arquivo['caminho'])
+        if no_periodo(arquivo):
+            frame = _ler_arquivo(caminho, campos)
+            frame['_lote'] = arquivo['lote']
+            frames.append(frame)
+        else:
+            fora.append((caminho, arquivo['lote']))
+    if not frames:
+        return pd.DataFrame(columns=campos or estado['campos'])
+
+    resultado = pd.concat(frames, ignore_index=True)
+    resultado = resultado.sort_values('_lote', kind='stable').drop_duplicates('id', keep='last')
+    if fora:
+        # Linhas que mudaram de mês depois: a versão nova está fora do período
+        lotes = pd.concat([
+            pd.DataFrame({'id': _ler_arquivo(caminho, ['id'])['id'], 'lote': lote})
+            for caminho, lote in fora
+        ]).groupby('id')['lote'].max()
+        mais_novo = resultado['id'].map(lotes)
+        resultado = resultado[~(mais_novo > resultado['_lote'])]
+    return resultado.drop(columns='_lote').reset_index(drop=True)
@@ -0,0 +1,205 @@
+# coding=utf-8
+"""
+Manutenção incremental de GastoMonthlySummary.
+
+Cada gravação de Gasto vira um delta (segmento, mês, valor, quantidade)
+aplicado com UPDATE ... SET total = total + x, sem reagregar a tabela.
+O valor de cada linha é o da parcela (``valor_mensal``): ``valor`` é o
+total da compra, repetido em todas as parcelas.
+As gravações em massa (bulk_create, queryset.update/delete) não disparam
+sinais: quem as usa chama ``apply_gastos`` ou roda o comando
+``rebuild_gasto_summary``. Os dois também invalidam o cache dos relatórios
+(website.report_cache), e ``apply_gastos`` o das páginas da lista de gastos.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncMonth
+
+from utils import month_start
+from vendor.cruds_adminlte import cache as crud_cache
+from .models import Gasto, GastoMonthlySummary
+from . import report_cache
+
+
+def valor_mensal():
+    """Valor que o gasto soma no mês: a parcela ou, sem ela, o valor."""
+    return Coalesce('valor_da_parcela', 'valor')
+
+
+def apply_delta(segmento_id, mes, total, quantidade):
+    """Soma total/quantidade à linha (segmento, mês), criando-a se preciso."""
+    if not total and not quantidade:
+        return
+    with transaction.atomic():
+        updated = GastoMonthlySummary.objects.filter(
+            segmento_id=segmento_id, mes=mes
+        ).update(total=F('total') + total, quantidade=F('quantidade') + quantidade)
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                GastoMonthlySummary.objects.create(
+                    segmento_id=segmento_id, mes=mes,
+                    total=total, quantidade=quantidade
+                )
+        except IntegrityError:
+            # Outro processo criou a linha entre o UPDATE e o INSERT
+            GastoMonthlySummary.objects.filter(
+                segmento_id=segmento_id, mes=mes
+            ).update(total=F('total') + total, quantidade=F('quantidade') + quantidade)
+
+
+def apply_gastos(gastos, sign=1):
+    """
+    Aplica de uma vez os deltas de vários gastos (ex.: depois de um
+    bulk_create): um INSERT das linhas de resumo que faltam e um único
+    UPDATE com CASE por (segmento, mês). ``sign=-1`` remove os gastos.
+    """
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for gasto in gastos:
+        chave = (gasto.segmento_id, month_start(gasto.datagasto))
+        deltas[chave][0] += sign * _valor_gasto(gasto)
+        deltas[chave][1] += sign
+    if not deltas:
+        return
+    report_cache.invalidate(segmento_id for segmento_id, mes in deltas)
+    crud_cache.touch(Gasto)
+    filtro = Q()
+    totais = []
+    quantidades = []
+    for (segmento_id, mes), (total, quantidade) in deltas.items():
+        chave = Q(segmento_id=segmento_id, mes=mes)
+        filtro |= chave
+        totais.append(When(chave, then=F('total') + Value(total)))
+        quantidades.append(When(chave, then=F('quantidade') + Value(quantidade)))
+    with transaction.atomic():
+        GastoMonthlySummary.objects.bulk_create(
+            [GastoMonthlySummary(segmento_id=segmento_id, mes=mes)
+             for segmento_id, mes in deltas],
+            ignore_conflicts=True
+        )
+        GastoMonthlySummary.objects.filter(filtro).update(
+            total=Case(*totais, output_field=models.DecimalField()),
+            quantidade=Case(*quantidades, output_field=models.IntegerField()),
+        )
+
+
+def aggregate_gastos(queryset=None):
+    """Agrega Gasto por (segmento, mês) direto das linhas."""
+    if queryset is None:
+        queryset = Gasto.objects.all()
+    rows = (
+        queryset.order_by()
+        .annotate(mes=TruncMonth('datagasto'))
+        .values('segmento_id', 'mes')
+        .annotate(total=Sum(valor_mensal()), quantidade=Count('id'))
+    )
+    return {
+        (row['segmento_id'], row['mes']): (row['total'] or Decimal('0'), row['quantidade'])
+        for row in rows
+    }
+
+
+def rebuild(segmento_ids=None):
+    """
+    Recria o resumo a partir de Gasto (só dos ``segmento_ids``, se dados).
+    Retorna o nº de linhas.
+    """
+    gastos = Gasto.objects.all()
+    resumos = GastoMonthlySummary.objects.all()
+    if segmento_ids is not None:
+        gastos = gastos.filter(segmento_id__in=segmento_ids)
+        resumos = resumos.filter(segmento_id__in=segmento_ids)
+    agregado = aggregate_gastos(gastos)
+    with transaction.atomic():
+        resumos.delete()
+        GastoMonthlySummary.objects.bulk_create(
+            [
+                GastoMonthlySummary(segmento_id=segmento_id, mes=mes,
+                                    total=total, quantidade=quantidade)
+                for (segmento_id, mes), (total, quantidade) in agregado.items()
+            ],
+            batch_size=1000
+        )
+        if segmento_ids is None:
+            report_cache.invalidate_all()
+        else:
+            report_cache.invalidate(segmento_ids)
+    return len(agregado)
+
+
+def verify():
+    """
+    Compara o resumo com a agregação das linhas de Gasto e retorna a lista
+    de divergências como (segmento_id, mês, esperado, encontrado).
+    """
+    esperado = aggregate_gastos()
+    encontrado = {
+        (row.segmento_id, row.mes): (row.total, row.quantidade)
+        for row in GastoMonthlySummary.objects.all()
+        if row.total or row.quantidade
+    }
+    divergencias = []
+    for chave in sorted(set(esperado) | set(encontrado), key=lambda c: (c[0], c[1])):
+        valor_esperado = esperado.get(chave, (Decimal('0'), 0))
+        valor_encontrado = encontrado.get(chave, (Decimal('0'), 0))
+        # O SQLite soma decimais em ponto flutuante: compara em centavos
+        if (_centavos(valor_esperado[0]) != _centavos(valor_encontrado[0])
+                or valor_esperado[1] != valor_encontrado[1]):
+            divergencias.append((chave[0], chave[1], valor_esperado, valor_encontrado))
+    return divergencias
+
+
+# SINAIS
+# ----------------------------------------------
+
+def gasto_pre_save(sender, instance, raw=False, **kwargs):
+    instance._summary_old = None
+    if instance.pk and not raw:
+        instance._summary_old = (
+            Gasto.objects.filter(pk=instance.pk)
+            .annotate(mensal=valor_mensal())
+            .values_list('segmento_id', 'datagasto', 'mensal', 'name')
+            .first()
+        )
+
+
+def gasto_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    mes = month_start(instance.datagasto)
+    valor = _valor_gasto(instance)
+    old = getattr(instance, '_summary_old', None)
+    instance._summary_old = None
+    if old is None:
+        apply_delta(instance.segmento_id, mes, valor, 1)
+        return
+    segmento_id, datagasto, valor_antigo = old[:3]
+    mes_antigo = month_start(datagasto)
+    if (segmento_id, mes_antigo) == (instance.segmento_id, mes):
+        apply_delta(segmento_id, mes, valor - _valor(valor_antigo), 0)
+    else:
+        apply_delta(segmento_id, mes_antigo, -_valor(valor_antigo), -1)
+        apply_delta(instance.segmento_id, mes, valor, 1)
+
+
+def gasto_post_delete(sender, instance, **kwargs):
+    apply_delta(instance.segmento_id, month_start(instance.datagasto),
+                -_valor_gasto(instance), -1)
+
+
+def _valor(valor):
+    return Decimal(str(valor)) if valor else Decimal('0')
+
+
+def _valor_gasto(gasto):
+    if gasto.valor_da_parcela is not None:
+        return _valor(gasto.valor_da_parcela)
+    return _valor(gasto.valor)
+
+
+def _centavos(valor):
+    return Decimal(str(valor)).quantize(Decimal('0.01'))
@@ -0,0 +1,424 @@
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.cache import caches
+from django.core import signing
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from vendor.cruds_adminlte.pagination import (
+    NEXT, PREVIOUS, decode_cursor, encode_cursor, keyset_paginate)
+from accounts.models import User
+from vendor.cruds_adminlte.search import FullTextSearchBackend
+
+from . import autocomplete, fts, manutencao, pecas_total, summary
+from .importer import GastoImporter
+from .seed import GeradorDados, remover_dados
+from .models import (
+    City, Comercio, DadoGerado, Gasto, GastoMonthlySummary, HoraTrabalhada,
+    Itenspecas, Pecas, Rabbiit, Segmento)
+from .reports import GanhosReport, GastoPorMesReport
+
+
+class CompraParceladaTests(TestCase):
+    """Uma compra de 300,00 em 3 parcelas pesa 100,00 em cada mês."""
+
+    def setUp(self):
+        self.segmento = Segmento.objects.create(name='Mercado', slug='mercado')
+        self.compra = Gasto(
+            name='Geladeira', slug='geladeira', parcelas=3,
+            valor=Decimal('300.00'), valor_da_parcela=Decimal('100.00'),
+            datagasto=date(2024, 1, 15), segmento=self.segmento,
+        )
+
+    def totais(self):
+        return {
+            linha.mes: (linha.total, linha.quantidade)
+            for linha in GastoMonthlySummary.objects.filter(segmento=self.segmento)
+        }
+
+    def esperado(self):
+        return {
+            date(2024, mes, 1): (Decimal('100.00'), 1) for mes in (1, 2, 3)
+        }
+
+    def test_resumo_pelos_sinais(self):
+        for parcela in self.compra.build_installments():
+            parcela.save()
+        self.assertEqual(self.totais(), self.esperado())
+        self.assertEqual(summary.verify(), [])
+
+        parcela = Gasto.objects.get(nro_da_parcela=2)
+        parcela.valor_da_parcela = Decimal('120.00')
+        parcela.save()
+        self.assertEqual(self.totais()[date(2024, 2, 1)], (Decimal('120.00'), 1))
+        parcela.delete()
+        self.assertEqual(self.totais()[date(2024, 2, 1)], (Decimal('0.00'), 0))
+        self.assertEqual(summary.verify(), [])
+
+    def test_resumo_em_massa_e_rebuild(self):
+        parcelas = Gasto.objects.bulk_create(self.compra.build_installments())
+        summary.apply_gastos(parcelas)
+        self.assertEqual(self.totais(), self.esperado())
+
+        summary.rebuild()
+        self.assertEqual(self.totais(), self.esperado())
+        self.assertEqual(summary.verify(), [])
+
+    def test_sem_valor_da_parcela_usa_o_valor(self):
+        Gasto.objects.create(
+            name='Pão', slug='pao', valor=Decimal('8.50'),
+            datagasto=date(2024, 1, 20), segmento=self.segmento,
+        )
+        self.assertEqual(self.totais()[date(2024, 1, 1)], (Decimal('8.50'), 1))
+
+    def test_relatorio_por_mes(self):
+        for parcela in self.compra.build_installments():
+            parcela.save()
+        # Janeiro e março entram pelas pontas (agregados das linhas),
+        # fevereiro pelo resumo
+        relatorio = GastoPorMesReport(
+            self.segmento.pk, dt_inicial=date(2024, 1, 10), dt_final=date(2024, 3, 20))
+        meses = {linha['mes']: (linha['total'], linha['quantidade']) for linha in relatorio.meses()}
+        self.assertEqual(meses, self.esperado())
+
+        filtrado = GastoPorMesReport(self.segmento.pk, valor_min=Decimal('300.00'))
+        self.assertEqual(
+            [(linha['total'], linha['quantidade']) for linha in filtrado.meses()],
+            [(Decimal('100.00'), 1)] * 3)
+
+
+class GanhosReportTests(TestCase):
+
+    def test_ganho_soma_o_total_gravado(self):
+        # 20 s a 10,00/h = 0,0556, gravado como 0,06: três registros somam
+        # 0,18 (em ponto flutuante seriam 0,17)
+        taxa = HoraTrabalhada.objects.create(price=Decimal('10.00'))
+        for _ in range(3):
+            Rabbiit.objects.create(description='r', duration=timedelta(seconds=20), rate_hour=taxa)
+        linhas = GanhosReport('mes').linhas()
+        self.assertEqual([linha['ganho'] for linha in linhas], [Decimal('0.18')])
+        self.assertEqual([linha['registros'] for linha in linhas], [3])
+
+
+class NameIndexTests(TestCase):
+
+    def setUp(self):
+        self.segmento = Segmento.objects.create(name='Mercado', slug='mercado')
+        autocomplete.name_index.invalidate()
+        self.addCleanup(autocomplete.name_index.invalidate)
+
+    def gasto(self, name):
+        return Gasto.objects.create(
+            name=name, slug='g', valor=Decimal('1.00'),
+            datagasto=date(2024, 1, 1), segmento=self.segmento)
+
+    def test_exclusao_e_renomeacao_sem_recarregar(self):
+        primeiro, segundo = self.gasto('Padaria'), self.gasto('Padaria')
+        self.assertEqual(autocomplete.suggest('pad'), ['Padaria'])
+
+        primeiro.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete.suggest('pad'), ['Padaria'])
+        segundo.name = 'Açougue'
+        segundo.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete.suggest('pad'), [])
+            self.assertEqual(autocomplete.suggest('acou'), ['Açougue'])
+        segundo.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete.suggest('a'), [])
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        segmento = Segmento.objects.create(name='Mercado', slug='mercado')
+        # Datas repetidas e parcelas nulas no meio da ordenação
+        for i in range(11):
+            Gasto.objects.create(
+                name='g{}'.format(i), slug='g', valor=Decimal('10.00'),
+                valor_da_parcela=None if i % 3 == 0 else Decimal(i % 4),
+                datagasto=date(2024, 1, 1 + i // 4), segmento=segmento)
+
+    def percorrer(self, ordering, tamanho=3):
+        """ids página a página para a frente e depois de volta pelos cursores."""
+        queryset = Gasto.objects.all()
+        paginas, cursor = [], None
+        while True:
+            pagina = keyset_paginate(queryset, tamanho, cursor, ordering)
+            paginas.append([gasto.pk for gasto in pagina])
+            if not pagina.has_next():
+                break
+            cursor = pagina.next_cursor
+        volta = [paginas[-1]]
+        while pagina.has_previous():
+            pagina = keyset_paginate(queryset, tamanho, pagina.previous_cursor, ordering)
+            volta.insert(0, [gasto.pk for gasto in pagina])
+        return paginas, volta
+
+    def esperado(self, chave, reverso=False):
+        gastos = sorted(Gasto.objects.all(), key=chave, reverse=reverso)
+        return [gasto.pk for gasto in gastos]
+
+    def test_valores_repetidos_nos_dois_sentidos(self):
+        paginas, volta = self.percorrer(['datagasto'])
+        ids = self.esperado(lambda g: (g.datagasto, g.pk))
+        self.assertEqual(sum(paginas, []), ids)
+        self.assertEqual(volta, paginas)
+
+        paginas, volta = self.percorrer(['-datagasto'])
+        self.assertEqual(sum(paginas, []), self.esperado(lambda g: (g.datagasto, g.pk), True))
+        self.assertEqual(volta, paginas)
+
+    def test_coluna_nula_fica_no_inicio(self):
+        def chave(gasto):
+            valor = gasto.valor_da_parcela
+            return (valor is not None, valor or 0, gasto.pk)
+
+        paginas, volta = self.percorrer(['valor_da_parcela'])
+        self.assertEqual(sum(paginas, []), self.esperado(chave))
+        self.assertEqual(volta, paginas)
+
+        paginas, volta = self.percorrer(['-valor_da_parcela'], tamanho=2)
+        self.assertEqual(sum(paginas, []), self.esperado(chave, True))
+        self.assertEqual(volta, paginas)
+
+    def test_cursor_assinado(self):
+        cursor = encode_cursor(NEXT, [date(2024, 1, 2), None, 7])
+        self.assertEqual(decode_cursor(cursor), (NEXT, ['2024-01-02', None, 7]))
+        self.assertEqual(decode_cursor(cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')),
+                         (None, None))
+        self.assertEqual(decode_cursor(cursor + 'x'), (None, None))
+        outro = signing.dumps([NEXT, [1]], salt='outro')
+        self.assertEqual(decode_cursor(outro), (None, None))
+        invalido = encode_cursor('x', [1])
+        self.assertEqual(decode_cursor(invalido), (None, None))
+
+    def test_cursor_invalido_volta_a_primeira_pagina(self):
+        primeira = [gasto.pk for gasto in keyset_paginate(Gasto.objects.all(), 3)]
+        for cursor in ('lixo', encode_cursor(PREVIOUS, [1, 2, 3]), encode_cursor('x', [1])):
+            pagina = keyset_paginate(Gasto.objects.all(), 3, cursor)
+            self.assertEqual([gasto.pk for gasto in pagina], primeira)
+            self.assertFalse(pagina.has_previous())
+            self.assertTrue(pagina.has_next())
+
+
+class BuscaTextualTests(TransactionTestCase):
+
+    def setUp(self):
+        self.segmento = Segmento.objects.create(name='Mercado', slug='mercado')
+        self.busca = FullTextSearchBackend(fields=['name'])
+
+    def gasto(self, name):
+        return Gasto.objects.create(
+            name=name, slug='g', valor=Decimal('1.00'),
+            datagasto=date(2024, 1, 1), segmento=self.segmento)
+
+    def buscar(self, termo):
+        return sorted(self.busca.search(Gasto.objects.all(), termo, rank=False)
+                      .values_list('name', flat=True))
+
+    @skipUnless(connection.vendor == 'sqlite', 'triggers FTS5 do SQLite')
+    def test_post_migrate_recria_triggers_apagados(self):
+        self.assertEqual(fts.triggers_faltando(connection), [])
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER website_gasto_fts_ai')
+        self.gasto('Padaria Central')
+        self.assertEqual(fts.triggers_faltando(connection), ['website_gasto_fts_ai'])
+        self.assertEqual(self.buscar('pada'), [])
+
+        fts.recriar_triggers(sender=None, using=connection.alias)
+        self.assertEqual(fts.triggers_faltando(connection), [])
+        self.assertEqual(self.buscar('pada'), ['Padaria Central'])
+        self.gasto('Padaria Norte')
+        self.assertEqual(self.buscar('pada'), ['Padaria Central', 'Padaria Norte'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'to_tsquery do PostgreSQL')
+    def test_prefixo_no_postgresql(self):
+        self.gasto('Padaria Central')
+        self.gasto('Farmácia São João')
+        self.assertEqual(self.buscar('pada'), ['Padaria Central'])
+        self.assertEqual(self.buscar('pad cent'), ['Padaria Central'])
+        self.assertEqual(self.buscar('farmacia joao'), ['Farmácia São João'])
+        # Aspas e operadores do tsquery são escapados, não dão erro de sintaxe
+        self.buscar("d'água & !x:*")
+
+
+class ImportadorTests(TestCase):
+
+    EXTRATO = (
+        'Data;Descrição;Valor;Categoria\n'
+        '15/01/2024;PADARIA;-12,50;Mercado\n'
+        '15/01/2024;PADARIA;-12,50;Mercado\n'
+        '16/01/2024;LOJA X PARC 03/10;-100,00;Mercado\n'
+        '17/01/2024;LOJA Y;-12,3,4;Mercado\n'
+        '18/01/2024;SALARIO;1000,00;Mercado\n'
+    ).encode('utf-8')
+
+    def setUp(self):
+        self.segmento = Segmento.objects.create(name='Mercado', slug='mercado')
+
+    def importar(self):
+        return GastoImporter().importar(io.BytesIO(self.EXTRATO))
+
+    def test_reimportar_o_mesmo_extrato_nao_duplica(self):
+        resultado = self.importar()
+        # Dois lançamentos iguais no mesmo extrato são dois gastos
+        self.assertEqual((resultado.lidos, resultado.criados, resultado.duplicados,
+                          resultado.ignorados), (5, 3, 0, 1))
+        self.assertEqual(Gasto.objects.filter(name='PADARIA').count(), 2)
+
+        resultado = self.importar()
+        self.assertEqual((resultado.criados, resultado.duplicados), (0, 3))
+        self.assertEqual(Gasto.objects.count(), 3)
+        self.assertEqual(summary.verify(), [])
+
+    def test_parcela_na_descricao(self):
+        self.importar()
+        parcela = Gasto.objects.get(name='LOJA X')
+        self.assertEqual((parcela.nro_da_parcela, parcela.parcelas), (3, 10))
+        self.assertEqual(parcela.valor_da_parcela, Decimal('100.00'))
+        self.assertEqual(parcela.valor, Decimal('1000.00'))
+        self.assertEqual(parcela.segmento, self.segmento)
+
+    def test_valor_invalido_vira_erro_da_linha(self):
+        resultado = self.importar()
+        self.assertEqual(resultado.erros, [(5, "valor inválido: '-12,3,4'")])
+        self.assertFalse(Gasto.objects.filter(name='LOJA Y').exists())
+
+
+class DadosGeradosTests(TestCase):
+
+    def test_remover_apaga_so_o_que_foi_gerado(self):
+        criados = GeradorDados(gastos=30, pecas=3, rabbiits=5, batch_size=7).gerar()
+        self.assertEqual(Gasto.objects.count(), criados['gasto'])
+
+        # Registros de usuário parecidos com os gerados, ou ligados a eles
+        segmento = Segmento.objects.get(slug='seed-supermercados')
+        meu_gasto = Gasto.objects.create(
+            name='Feira', slug='feira', valor=Decimal('30.00'),
+            datagasto=date(2024, 1, 1), segmento=segmento)
+        taxa = HoraTrabalhada.objects.create(price=Decimal('10.00'), content='seed')
+        meu_rabbiit = Rabbiit.objects.create(description='seed Reunião', rate_hour=taxa)
+        nota = Pecas.objects.order_by('pk').first()
+        meu_item = Itenspecas.objects.create(
+            pecas=nota, description='Pneu', price=Decimal('100.00'), quantity=1)
+
+        removidos = remover_dados()
+        self.assertEqual(removidos['gasto'], criados['gasto'])
+        self.assertEqual(removidos['rabbiit'], criados['rabbiit'])
+        self.assertEqual(removidos['itenspecas'], criados['itenspecas'])
+        self.assertEqual(removidos['pecas'], criados['pecas'] - 1)
+        self.assertEqual(removidos['segmento'], criados['segmento'] - 1)
+
+        self.assertEqual(list(Gasto.objects.all()), [meu_gasto])
+        self.assertEqual(list(Segmento.objects.all()), [segmento])
+        self.assertEqual(list(Rabbiit.objects.all()), [meu_rabbiit])
+        self.assertEqual(list(HoraTrabalhada.objects.all()), [taxa])
+        self.assertEqual(list(Itenspecas.objects.all()), [meu_item])
+        self.assertEqual(list(Pecas.objects.all()), [nota])
+        nota.refresh_from_db()
+        self.assertEqual(nota.total, Decimal('100.00'))
+        self.assertFalse(DadoGerado.objects.exists())
+        self.assertEqual(summary.verify(), [])
+
+
+class PecasTotalTests(TestCase):
+
+    def setUp(self):
+        comercio = Comercio.objects.create(description='Auto Peças')
+        city = City.objects.create(description='Campinas')
+        self.nota, self.outra = [
+            Pecas.objects.create(data=date(2024, 1, 1), veiculo='C', comercio=comercio,
+                                 city=city, total=Decimal('0'))
+            for _ in range(2)
+        ]
+
+    def item(self, price, quantity=1, pecas=None):
+        return Itenspecas.objects.create(
+            pecas=pecas or self.nota, description='Filtro', price=Decimal(price), quantity=quantity)
+
+    def totais(self):
+        return [Pecas.objects.get(pk=nota.pk).total for nota in (self.nota, self.outra)]
+
+    def test_criar_editar_apagar_e_mudar_de_nota(self):
+        filtro = self.item('12.50', 2)
+        oleo = self.item('40.00')
+        self.assertEqual(filtro.subtotal, Decimal('25.00'))
+        self.assertEqual(self.totais(), [Decimal('65.00'), Decimal('0.00')])
+
+        filtro.quantity = 3
+        filtro.save()
+        self.assertEqual(self.totais(), [Decimal('77.50'), Decimal('0.00')])
+
+        # Item carregado do banco e movido: as duas notas mudam
+        oleo = Itenspecas.objects.get(pk=oleo.pk)
+        oleo.pecas = self.outra
+        oleo.save()
+        self.assertEqual(self.totais(), [Decimal('37.50'), Decimal('40.00')])
+
+        filtro.delete()
+        self.assertEqual(self.totais(), [Decimal('0.00'), Decimal('40.00')])
+
+    def test_adiar_recalcula_uma_vez(self):
+        with CaptureQueriesContext(connection) as consultas:
+            with pecas_total.adiar():
+                self.item('10.00')
+                self.item('5.00', 2, pecas=self.outra)
+                self.item('1.00').delete()
+                self.assertEqual(self.totais(), [Decimal('0'), Decimal('0')])
+        updates = [q['sql'] for q in consultas.captured_queries
+                   if q['sql'].startswith('UPDATE "website_pecas"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.totais(), [Decimal('10.00'), Decimal('10.00')])
+
+
+class RelatorioPermissaoTests(TestCase):
+    """Relatórios só para usuários logados com a permissão de ver o model."""
+
+    def entrar(self, permissao=None):
+        user = User.objects.create_user(
+            username=permissao or 'sem', email='{}@example.com'.format(permissao), password='senha')
+        if permissao:
+            user.user_permissions.add(Permission.objects.get(codename=permissao))
+        self.client.force_login(user)
+
+    def test_manutencao(self):
+        comercio = Comercio.objects.create(description='Auto Peças')
+        city = City.objects.create(description='Campinas')
+        for dia, troca in ((1, 1000), (31, 4000)):
+            nota = Pecas.objects.create(data=date(2024, 1, dia), veiculo='C', comercio=comercio,
+                                        city=city, troca=troca, proxtroca=troca + 3000)
+            Itenspecas.objects.create(pecas=nota, description='Óleo', price=Decimal('60.00'))
+        # As trocas de geração do cache esperam um commit que o TestCase não faz
+        caches[settings.REPORT_CACHE_ALIAS].delete(manutencao.GENERATION_KEY)
+
+        url = reverse('manutencao')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.entrar()
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.entrar('view_pecas')
+        resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        # 60,00 por troca a cada 30 dias
+        self.assertEqual(resposta.context['linhas'][0]['custo_dia'], 2.0)
+        self.assertContains(resposta, 'Custo por dia')
+
+    def test_ganhos(self):
+        url = reverse('rabbiit_ganhos', args=['mes'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.entrar()
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.entrar('view_rabbiit')
+        resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['linhas'], [])
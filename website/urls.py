@@ -3,7 +3,7 @@ from django.conf.urls.static import static
 from django.urls import path, include
 
 from .views import (
-    GastoSegmentoListView, gastosPorMesView, AutoCompleteView,
+    GastoSegmentoListView, gastosPorMesView, manutencaoView, ganhosView, AutoCompleteView, GastoImportarView,
     SegmentoCRUD, GastoCRUD, RabbiitCRUD,
     CityCRUD, ComercioCRUD, PecasListView,
     PecasCreateView, PecasEditView, HoraTrabalhadaListView,
@@ -32,8 +32,11 @@ urlpatterns = [
     path('website/pecas/edit/<pk>/', PecasEditView.as_view(), name="website_pecas_edit"),
     path('', include(comercio_view.get_urls())),
     path('gasto/autocomplete/', AutoCompleteView.as_view()),
+    path('gasto/importar/', GastoImportarView.as_view(), name="gastoImportar"),
     path('gastosPorSegmento/', GastoSegmentoListView.as_view(), name="gastosPorSegmento"),
     path('gastosPorMes/', gastosPorMesView, name="gastosPorMes"),
+    path('manutencao/', manutencaoView, name="manutencao"),
+    path('website/rabbiit/ganhos/<periodo>/', ganhosView, name="rabbiit_ganhos"),
 ]
 
 if settings.DEBUG:
@@ -1,27 +1,32 @@
 # coding=utf-8
-import json
 from datetime import date, timedelta
 
-import pandas as pd
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Q
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import Http404, JsonResponse
 from django.http.response import HttpResponseRedirect
 from django.shortcuts import render, redirect
 from django.urls import reverse_lazy
+from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.views.generic import ListView, FormView, CreateView, TemplateView, UpdateView, DeleteView
 
-from utils import change_comma_by_dot
+from utils import parse_periodo
 from vendor.cruds_adminlte.crud import CRUDView
+from vendor.cruds_adminlte.search import FullTextSearchBackend
 from .forms import (
     SegmentoForm, GastoForm, RabbiitForm,
     PecasForm, ComercioForm, ItensPecasForm, ItemPecasFormSet,
-    HoraTrabalhadaForm
+    HoraTrabalhadaForm, ImportarExtratoForm
 )
 from .models import (
     Segmento, Gasto, Rabbiit, HoraTrabalhada, City,
     Pecas, Itenspecas, Comercio
 )
+from .importer import GastoImporter
+from .reports import GastoPorMesReport, GanhosReport
+from . import autocomplete, manutencao, pecas_total, report_cache, summary
 
 
 class GastoCRUD(CRUDView):
@@ -30,12 +35,18 @@ class GastoCRUD(CRUDView):
     # template_name_base = 'website/gasto/gasto_list.html'
     namespace = None
     check_perms = True
-    views_available = ['list', 'create', 'delete', 'update']
+    page_cache = True
+    views_available = ['list', 'create', 'delete', 'update', 'export']
     fields = ['name', 'slug', 'valor', 'nro_da_parcela', 'valor_da_parcela', 'parcelas', 'datagasto', ]
     list_fields = ('name', 'parcelas', 'nro_da_parcela', 'valor_da_parcela', 'valor', 'datagasto', 'segmento',)
     search_fields = ('name__icontains',)
+    search_backend = FullTextSearchBackend(fields=['name'])
+    list_filter = ['segmento']
+    list_filter_facets = True
+    export_fields = ('id', 'name', 'datagasto', 'valor', 'parcelas', 'nro_da_parcela',
+                     'valor_da_parcela', 'segmento__name',)
     paginate_by = 10
-    paginate_template = 'cruds/pagination/prev_next.html'
+    pagination_mode = 'keyset'
 
     add_form = GastoForm
     update_form = GastoForm
@@ -46,29 +57,13 @@ class GastoCRUD(CRUDView):
         class UCreateView(View):
 
             def form_valid(self, form):
-                self.object = form.save(commit=False)
-                # self.object.save()
-                dados = self.object
-                quantidades_parcelas_faltantes = 1
-                numero_da_parcela = self.object.nro_da_parcela
-                # form.cleaned_data
-                while self.object.parcelas >= quantidades_parcelas_faltantes:
-                    # for dado in range(form.cleaned_data.parcelas):
-                    day = 30 * quantidades_parcelas_faltantes - 30
-                    gasto = Gasto()
-                    gasto.name = self.object.name
-                    gasto.slug = self.object.slug
-                    gasto.nro_da_parcela = numero_da_parcela
-                    gasto.valor = self.object.valor
-                    gasto.valor_da_parcela = self.object.valor_da_parcela
-                    gasto.datagasto = self.object.datagasto + timedelta(days=day)
-                    gasto.segmento = self.object.segmento
-                    gasto.nro_da_parcela = quantidades_parcelas_faltantes
-                    gasto.parcelas = self.object.parcelas
-                    self.object.save()
-                    quantidades_parcelas_faltantes += 1
-                    numero_da_parcela += 1
-
+                gasto = form.save(commit=False)
+                parcelas = gasto.build_installments()
+                with transaction.atomic():
+                    Gasto.objects.bulk_create(parcelas)
+                    summary.apply_gastos(parcelas)
+                autocomplete.name_index.add(gasto.name, len(parcelas))
+                self.object = parcelas[0]
                 return HttpResponseRedirect(self.get_success_url())
 
         return UCreateView
@@ -79,9 +74,11 @@ class SegmentoCRUD(CRUDView):
     template_name_base = 'ccruds'
     namespace = None
     check_perms = True
+    page_cache = True
     views_available = ['create', 'list', 'delete', 'update']
     list_fields = ['name', ]
     search_fields = ['name__icontains']
+    search_backend = FullTextSearchBackend(fields=['name'])
     split_space_search = ' '  # default False
     add_form = SegmentoForm
     update_form = SegmentoForm
@@ -92,13 +89,15 @@ class RabbiitCRUD(CRUDView):
     template_name_base = 'ccruds'
     namespace = None
     check_perms = True
-    views_available = ['create', 'list', 'delete', 'update']
+    page_cache = True
+    views_available = ['create', 'list', 'delete', 'update', 'export']
     list_fields = [
         'created_at', 'description', 'time_start',
-        'time_end', 'time_total', 'rate_hour',
+        'time_end', 'duration', 'rate_hour',
         'rate_total',
     ]
     search_fields = ['description__icontains']
+    pagination_mode = 'keyset'
     add_form = RabbiitForm
     update_form = RabbiitForm
 
@@ -233,52 +232,51 @@ class CityCRUD(CRUDView):
     template_name_base = 'ccruds'
     namespace = None
     check_perms = True
+    page_cache = True
     views_available = ['create', 'list', 'delete', 'update']
     fields = ['id', 'description', ]
     list_fields = ['id', 'description', ]
 
 
 class PecasListView(TemplateView):
+    """
+    Lista de peças. A busca ``q`` que for uma data ou período (ver
+    utils.parse_periodo) vira um filtro por faixa em ``data``; o resto busca
+    no comércio e na cidade. Cada linha já vem com comércio, cidade,
+    quantidade de itens e o total (Pecas.total), na mesma consulta.
+    """
     model = Pecas
     template_name = 'website/pecas_list.html'
     paginate_by = 10
 
     def get_queryset(self):
-        queryset_list = Pecas.objects.all()
-        query = self.request.GET.get("q")
+        queryset = Pecas.objects.all()
+        query = self.request.GET.get("q", "").strip()
         if query:
-            queryset_list = queryset_list.filter(
-                Q(comercio__icontains=query) |
-                Q(data__icontains=query)
-            ).distinct()
-
-        paginator = Paginator(queryset_list, 5)  # Show 5 pecas per page
-        page = self.request.GET.get('page')
-        try:
-            queryset_list = paginator.page(page)
-        except PageNotAnInteger:
-            # If page is not an integer, deliver first page.
-            queryset_list = paginator.page(1)
-        except EmptyPage:
-            # If page is out of range (e.g. 999), deliver last page of results.
-            queryset_list = paginator.page(paginator.num_pages)
-
-        return queryset_list
+            periodo = parse_periodo(query)
+            if periodo:
+                queryset = queryset.filter(data__range=periodo)
+            else:
+                queryset = queryset.filter(
+                    Q(comercio__description__icontains=query) |
+                    Q(city__description__icontains=query)
+                )
+        return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        list_pecas = Pecas.objects.order_by('-id')
-        # queryset_list = Pecas.objects.all()
-        query = self.request.GET.get("q")
-        if query:
-            list_pecas = list_pecas.filter(
-                Q(comercio__description__icontains=query) |
-                Q(data__icontains=query)
-            ).distinct()
-        paginator = Paginator(list_pecas, self.paginate_by)
+        queryset = self.get_queryset()
+        linhas = (
+            queryset
+            .select_related('comercio', 'city')
+            .annotate(itens=Count('itenspecas'))
+            .order_by('-id')
+        )
+        paginator = Paginator(linhas, self.paginate_by)
+        # COUNT sem o GROUP BY das anotações
+        paginator.count = queryset.count()
 
         page = self.request.GET.get('page')
-
         try:
             object_list = paginator.page(page)
         except PageNotAnInteger:
@@ -286,7 +284,7 @@ class PecasListView(TemplateView):
         except EmptyPage:
             object_list = paginator.page(paginator.num_pages)
         context['object_list'] = object_list
-        # context['object_list'] = Pecas.objects.order_by('-id')
+        context['q'] = self.request.GET.get("q", "")
         return context
 
 
@@ -310,11 +308,11 @@ class PecasCreateView(CreateView):
         forms = context['forms']
         formset = context['formset']
         if forms.is_valid() and formset.is_valid():
-            self.object = form.save()
-            forms.instance = self.object
-            formset.instance = self.object
-            forms.save()
-            formset.save()
+            # O total é recalculado a partir dos itens ao sair do bloco
+            with pecas_total.adiar():
+                self.object = form.save()
+                formset.instance = self.object
+                formset.save()
             return redirect('website_pecas_list')
         else:
             return self.render_to_response(self.get_context_data(form=form))
@@ -340,22 +338,10 @@ class PecasEditView(UpdateView):
         form = context['forms']
         formset = context['formset']
         if form.is_valid() and formset.is_valid():
-            sizeIensPecas = len(formset.cleaned_data)
-            total = 0.00
-            for chave in range(sizeIensPecas):
-                try:
-                    total += float(formset.cleaned_data[chave]['subtotal'])
-                except:
-                    ...
-            try:
-                form.cleaned_data['total'] = str(total)
-            except Exception as err:
-                form.cleaned_data['total'] = 0
-                print(f'Err.: {err}')
-            # form = form.save(commit=False)
-            # form.total = str(total)
-            form.save()
-            formset.save()
+            # O total é recalculado a partir dos itens ao sair do bloco
+            with pecas_total.adiar():
+                form.save()
+                formset.save()
             return redirect('website_pecas_list')
         else:
             return self.render_to_response(self.get_context_data(form=form))
@@ -368,7 +354,7 @@ class ItensPecasCRUD(CRUDView):
     namespace = None
     check_perms = True
     views_available = ['create', 'list', 'delete', 'update']
-    fields = ['description', 'pecas', 'price', 'quantity', 'subtotal', ]
+    fields = ['description', 'pecas', 'price', 'quantity', ]
     list_fields = ['id', 'description', 'pecas', 'price', 'quantity', 'subtotal', ]
     # inlines = [Itenspecas_AjaxCRUD, ]
     add_form = ItensPecasForm
@@ -382,6 +368,7 @@ class ComercioCRUD(CRUDView):
     namespace = None
     # search_fields = ('head__name__icontains', 'head__email__icontains')
     check_perms = True
+    page_cache = True
     views_available = ['create', 'list', 'update', 'delete', ]
     fields = ['description']
     list_fields = ('id', 'description',)
@@ -412,83 +399,104 @@ class GastoSegmentoListView(ListView):
 
 def gastosPorMesView(request):
     template = "website/gastosPorMes.html"
-    qs = Gasto.objects.all()  # Use the Pandas Manager
     segmentos = Segmento.objects.all()
-    if request.method == 'POST':
-        segmento_id = int(request.POST.get('segmento_id'))
-        dtInicial = request.POST.get('dtInicial')
-        dtFinal = request.POST.get('dtFinal')
-        valor = request.POST.get('valor')
-        if dtInicial == '':
-            dtInicial = '2018-01-01'
-        if dtFinal == '':
-            dtFinal = date.today()
-        df = qs.filter(segmento_id=segmento_id) \
-            .to_dataframe(
-            ['id', 'name', 'datagasto', 'valor', 'segmento_id'],
-            index='segmento_id'
-        )
-        if valor:
-            if not ',' in valor:
-                valor = ''.join((valor, ',00'))
-            df = df.loc[(df['valor'] == str(valor))]
-            # df = df.loc[df['valor'] == '50,00']
-        df['valor'] = [change_comma_by_dot(e) for e in df['valor']]
-        # df['valor'] = [e.replace(",", ".") for e in df['valor']]
-        df['valor'] = df['valor'].astype('float')
-        df['datagasto'] = pd.to_datetime(df['datagasto'])
-        df = df.loc[(df['datagasto'] >= dtInicial) & (df['datagasto'] <= dtFinal)]
-        # df['valor'].loc[(df['datagasto'] >= dtInicial) & (df['datagasto'] <= dtFinal)].sum()
-        """Format the column headers for the Bootstrap table, 
-        they're just a list of field names,
-        duplicated and turned into dicts like this: {'field': 'foo', 'title: 'foo'}
-        columns = [{'field': f, 'title': f} for f in Gasto._Meta.fields]
-        columns = [{'field': f['_verbose_name'], 'title': f} for f in Gasto._meta.fields]
-        """
-        col = [f for f in Gasto._meta.get_fields()]
-        columns = [{'field': f, 'title': f} for f in df.columns]
-        """Write the DataFrame to JSON (as easy as can be)
-            output just the records (no fieldnames) as a collection of tuples
-            Proceed to create your context object containing the columns and the data"""
-
-        # data = df.to_json(orient='records', lines=True)
-        context = {
-            'data': df.itertuples(),
-            'segmentos': segmentos
-        }
-    else:
-        context = {
-            'segmentos': segmentos
-        }
+    params = request.POST if request.method == 'POST' else request.GET
+    context = {
+        'segmentos': segmentos,
+        'params': params,
+    }
+    report = GastoPorMesReport.from_params(params)
+    if report is not None:
+        meses = report_cache.meses(report)
+        page = report_cache.page(report, params.get('page'))
+        querystring = params.copy()
+        querystring.pop('page', None)
+        querystring.pop('csrfmiddlewaretoken', None)
+        context.update({
+            'meses': meses,
+            'total_geral': sum(m['total'] for m in meses),
+            'quantidade_geral': sum(m['quantidade'] for m in meses),
+            'data': page.object_list,
+            'page_obj': page,
+            'querystring': querystring.urlencode(),
+            'segmento_id': report.segmento_id,
+        })
+    return render(request, template, context)
+
+
+@login_required
+@permission_required('website.view_pecas', raise_exception=True)
+def manutencaoView(request):
+    """Previsão da próxima troca de cada peça (ver website.manutencao)."""
+    template = "website/manutencao.html"
+    veiculo = request.GET.get('veiculo', '')
+    linhas = manutencao.previsao()
+    if veiculo:
+        linhas = [linha for linha in linhas if linha['veiculo'] == veiculo]
+    hoje = date.today()
+    context = {
+        'linhas': linhas,
+        'veiculos': manutencao.VEICULOS.items(),
+        'veiculo': veiculo,
+        'hoje': hoje,
+        # trocas previstas até esta data aparecem em destaque
+        'limite': hoje + timedelta(days=30),
+    }
     return render(request, template, context)
 
 
+@login_required
+@permission_required('website.view_rabbiit', raise_exception=True)
+def ganhosView(request, periodo):
+    """
+    Ganhos do Rabbiit por dia, semana ou mês e por ganho/hora, em JSON
+    (ver GanhosReport). Filtros opcionais: dtInicial, dtFinal e rate_hour.
+    """
+    try:
+        report = GanhosReport.from_params(periodo, request.GET)
+    except ValueError:
+        raise Http404
+    linhas = report.linhas()
+    for linha in linhas:
+        linha['duracao'] = int(linha['duracao'].total_seconds())
+    return JsonResponse({
+        'periodo': periodo,
+        'dtInicial': report.dt_inicial,
+        'dtFinal': report.dt_final,
+        'linhas': linhas,
+        'total': sum(linha['ganho'] for linha in linhas),
+    })
+
+
 # CADASTRAMENTO DE GASTOS
 # ----------------------------------------------
 
 
+class GastoImportarView(PermissionRequiredMixin, FormView):
+    """Importa um extrato bancário enviado pelo usuário (ver website.importer)."""
+    template_name = 'website/guiabolso.html'
+    form_class = ImportarExtratoForm
+    permission_required = 'website.add_gasto'
+
+    def form_valid(self, form):
+        importer = GastoImporter(
+            segmento_padrao=form.cleaned_data['segmento'],
+            apenas_debitos=not form.cleaned_data['todos'],
+        )
+        try:
+            resultado = importer.importar(form.cleaned_data['arquivo'],
+                                          form.cleaned_data['formato'] or None)
+        except ValueError as erro:
+            form.add_error('arquivo', str(erro))
+            return self.form_invalid(form)
+        return self.render_to_response(self.get_context_data(form=form, resultado=resultado))
+
+
 class AutoCompleteView(FormView):
     def get(self, request):
-        q = request.GET.get('term', '').capitalize()
-        if q:
-            gastos = Gasto.objects.filter(name__icontains=q).order_by('name').distinct('name')
-            # gastos = Gasto.objects.filter(name__icontains=q).distinct('name')
-        else:
-            gastos = Gasto.objects.all()
-        results = []
-        for gasto in gastos:
-            if results:
-                if gasto.name not in results[0]['name']:
-                    gasto_json = {}
-                    gasto_json['name'] = gasto.name
-                    results.append(gasto_json)
-            else:
-                gasto_json = {}
-                gasto_json['name'] = gasto.name
-                results.append(gasto_json)
-        data = json.dumps(results)
-        mimetype = 'application/json'
-        return HttpResponse(data, mimetype)
+        q = request.GET.get('term', '')
+        results = [{'name': name} for name in autocomplete.suggest(q)]
+        return JsonResponse(results, safe=False)
 
 
 class AutoResponseView(ListView):